@@ -0,0 +1,158 @@
+# Benchmark jalur panas pengolahan SOTK di atas data sintetis.
+#
+#   python benchmarks/run_benchmarks.py --sizes 1000 10000 100000 -o hasil.json
+#   python benchmarks/run_benchmarks.py --compare benchmarks/baselines/baseline.json
+#
+# Waktu = median beberapa ulangan (perf_counter); memori = puncak alokasi Python/NumPy
+# selama satu ulangan terpisah (tracemalloc, tidak mencakup buffer Arrow).
+import argparse
+import datetime
+import io
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from sotk_core import (  # noqa: E402
+    NameSearchIndex, RollupCube, build_export_bytes, build_sotk_index, classify_jabatan,
+    iter_listing_chunks, process_sotk_data, read_sotk_file, resolve_hierarchy,
+    table_fingerprint, tag_sectors, validate_listing, write_laporan_konsolidasi,
+)
+from synthetic import generate_listing, generate_sotk  # noqa: E402
+
+XLSX_MAX_UNITS = 100_000  # openpyxl terlalu lambat untuk ukuran di atas ini
+SEARCH_QUERIES = ['dinas pendidikan', 'puskesmas', 'sd negeri 12', 'seksi', 'bidang 7', 'guru', 'farmasi', 'xyz tidak ada']
+
+def measure(fn, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    tracemalloc.start()
+    fn()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return statistics.median(times), peak / 1024 / 1024
+
+def build_cases(units, seed):
+    # Setiap kasus: (nama, fungsi tanpa argumen). Persiapan di luar fungsi tidak ikut diukur.
+    raw = generate_sotk(units, seed=seed)
+    csv_bytes = raw.to_csv(index=False).encode('utf-8')
+    df, orphans, _, tabel = process_sotk_data(raw.copy())
+    ids = raw['ID'].astype(str)
+    parents = raw['DIATASAN ID']
+    name_index = NameSearchIndex(df['NAMA UNOR'])
+    sotk_index = build_sotk_index(df)
+    cube = RollupCube(df)
+    cube.sunburst_nodes()  # tabel anak per node dibuat sekali; yang diukur penguraian per fokus
+    listing_bytes = generate_listing(df, units, seed=seed).to_csv(index=False).encode('utf-8')
+
+    cases = [
+        ('ingest_csv', lambda: read_sotk_file(csv_bytes, 'sotk.csv')),
+        ('process_sotk_data', lambda: process_sotk_data(raw.copy())),
+        ('resolve_hierarchy', lambda: resolve_hierarchy(ids, parents)),
+        ('classify_jabatan', lambda: classify_jabatan(df)),
+        ('tag_sectors', lambda: tag_sectors(df['NAMA UNOR'])),
+        ('rollup_cube', lambda: RollupCube(df)),
+        ('sunburst_lod', lambda: [cube.sunburst_nodes(focus) for focus in [()] + [(n,) for n in cube.children(())['NAMA'][:3]]]),
+        ('search_index_build', lambda: NameSearchIndex(df['NAMA UNOR'])),
+        ('search_queries', lambda: [name_index.search(q) for q in SEARCH_QUERIES]),
+        ('search_fuzzy', lambda: [name_index.search_fuzzy(q) for q in SEARCH_QUERIES]),
+        ('validate_listing', lambda: validate_listing(iter_listing_chunks(listing_bytes, 'listing.csv'), df, sotk_index)),
+        ('table_fingerprint', lambda: table_fingerprint(df)),
+        ('export_csv', lambda: build_export_bytes(df, 'csv')),
+        ('laporan_konsolidasi', lambda: write_laporan_konsolidasi(io.BytesIO(), df, orphans, tabel, cube)),
+    ]
+    if units <= XLSX_MAX_UNITS:
+        buffer = io.BytesIO()
+        raw.to_excel(buffer, index=False)
+        xlsx_bytes = buffer.getvalue()
+        cases += [
+            ('ingest_xlsx', lambda: read_sotk_file(xlsx_bytes, 'sotk.xlsx')),
+            ('export_xlsx', lambda: build_export_bytes(df, 'xlsx')),
+        ]
+    return cases
+
+def run(sizes, repeat, seed, only=None):
+    results = []
+    for units in sizes:
+        for name, fn in build_cases(units, seed):
+            if only and name not in only:
+                continue
+            seconds, peak_mb = measure(fn, repeat)
+            results.append({'case': name, 'units': units, 'seconds': round(seconds, 5), 'peak_mb': round(peak_mb, 2)})
+            print(f"{name:<20} {units:>9,} unit  {seconds * 1000:10.1f} ms  {peak_mb:8.1f} MB", flush=True)
+    return {
+        'meta': {
+            'dibuat': datetime.datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'pandas': pd.__version__,
+            'numpy': np.__version__,
+            'platform': platform.platform(),
+            'cpu': os.cpu_count(),
+            'repeat': repeat,
+            'seed': seed,
+        },
+        'results': results,
+    }
+
+def compare(current, baseline, tolerance):
+    # Kembalikan daftar kasus yang melambat lebih dari `tolerance` dibanding baseline
+    base = {(r['case'], r['units']): r for r in baseline['results']}
+    regressions = []
+    print(f"\n{'kasus':<20} {'unit':>9}  {'baseline':>10}  {'sekarang':>10}  rasio")
+    for r in current['results']:
+        b = base.get((r['case'], r['units']))
+        if b is None:
+            continue
+        ratio = r['seconds'] / b['seconds'] if b['seconds'] else float('inf')
+        flag = '  << LEBIH LAMBAT' if ratio > 1 + tolerance else ''
+        print(f"{r['case']:<20} {r['units']:>9,}  {b['seconds'] * 1000:8.1f}ms  {r['seconds'] * 1000:8.1f}ms  {ratio:5.2f}{flag}")
+        if flag:
+            regressions.append(r['case'])
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark pengolahan SOTK.')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1_000, 10_000, 100_000])
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--only', nargs='+', help='Hanya jalankan kasus tertentu')
+    parser.add_argument('-o', '--output', help='Simpan hasil sebagai JSON (mis. baseline baru)')
+    parser.add_argument('--compare', help='Bandingkan dengan file baseline JSON')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='Batas perlambatan relatif (default 0.25 = 25%%)')
+    args = parser.parse_args()
+
+    sizes = args.sizes
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)
+        if '--sizes' not in sys.argv:
+            sizes = sorted({r['units'] for r in baseline['results']})
+
+    current = run(sizes, args.repeat, args.seed, args.only)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(current, f, indent=2)
+        print(f"\nHasil disimpan ke {args.output}")
+
+    if baseline is not None:
+        regressions = compare(current, baseline, args.tolerance)
+        if regressions:
+            print(f"\n{len(regressions)} kasus melambat > {args.tolerance:.0%}")
+            return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,177 @@
+# Generator data SOTK sintetis untuk benchmark (pohon realistis, ukuran bebas).
+#
+#   python benchmarks/synthetic.py --units 100000 -o sotk_100k.xlsx
+#   python benchmarks/synthetic.py --units 5000 --jenis-mix FUNGSIONAL=3 PELAKSANA=1 \
+#       --eselon-mix 2 III.a=1 III.b=1 -o sotk_5k.csv
+import argparse
+
+import numpy as np
+import pandas as pd
+
+# Kosakata nama per kedalaman (1 = SKPD); nama sektor ikut agar SEKTOR_RULES teruji
+NAMA_PER_LEVEL = {
+    1: ['DINAS PENDIDIKAN', 'DINAS KESEHATAN', 'BADAN KEUANGAN DAERAH', 'SEKRETARIAT DAERAH',
+        'DINAS PEKERJAAN UMUM', 'KECAMATAN', 'INSPEKTORAT', 'DINAS SOSIAL'],
+    2: ['BIDANG', 'BAGIAN', 'SEKRETARIAT', 'UPTD PUSKESMAS', 'RSUD', 'SD NEGERI', 'SMP NEGERI', 'TK PERTIWI'],
+    3: ['SEKSI', 'SUBBAGIAN', 'SUB BIDANG', 'INSTALASI FARMASI', 'KELAS'],
+}
+NAMA_JABATAN = ['PENGADMINISTRASI UMUM', 'ANALIS KEBIJAKAN', 'GURU', 'PERAWAT', 'BIDAN', 'PENGELOLA KEUANGAN', 'PRANATA KOMPUTER']
+ESELON_PER_LEVEL = {1: ['II.a', 'II.b', '22'], 2: ['III.a', 'III.b', '31'], 3: ['IV.a', 'IV.b', '41']}
+# Bobot kode ESELON per kedalaman struktural (1..3 di bawah SKPD); default rata
+ESELON_MIX = {d: {code: 1.0 for code in codes} for d, codes in ESELON_PER_LEVEL.items()}
+JENJANG_PER_LEVEL = {1: 'JPT PRATAMA', 2: 'ADMINISTRATOR', 3: 'PENGAWAS'}
+JENIS_MIX = {'FUNGSIONAL': 0.4, 'PELAKSANA': 0.5, 'FUNGSIONAL UMUM': 0.1}
+
+def _pick(rng, mix, size):
+    # Ambil `size` label dari dict {label: bobot}
+    labels = np.asarray(list(mix), dtype=object)
+    weights = np.asarray(list(mix.values()), dtype=float)
+    return labels[rng.choice(len(labels), size, p=weights / weights.sum())]
+
+def _sample_rows(rng, n, rate):
+    # Baris acak (selain akar) untuk kerusakan data yang disengaja
+    count = int(rate * n) if n > 1 else 0
+    return rng.choice(np.arange(1, n), count, replace=False) if count else np.array([], dtype=np.int64)
+
+def generate_sotk(units, max_depth=7, fanout=(2, 8), skpd=40, orphan_rate=0.005,
+                  cycle_rate=0.0, duplicate_rate=0.0, jenis_mix=None, eselon_mix=None, seed=0):
+    """DataFrame SOTK sintetis berkolom sama seperti ekspor SOTK asli.
+
+    Pohon dibangun level demi level dari satu akar (BUPATI) dan `skpd` unit Level 2;
+    tiap node mendapat `fanout` anak sampai `units` tercapai atau `max_depth` habis
+    (sisa unit lalu digantung acak di level terdalam). Level 1..3 di bawah SKPD
+    berjabatan struktural (ESELON II..IV, kode diambil dengan bobot `eselon_mix`
+    {kedalaman: {kode: bobot}}), level lebih dalam memakai `jenis_mix` {jenis: bobot}.
+    """
+    rng = np.random.default_rng(seed)
+    jenis_mix = jenis_mix or JENIS_MIX
+    eselon_mix = {**ESELON_MIX, **(eselon_mix or {})}
+
+    parent = [np.array([-1]), np.full(min(skpd, units - 1), 0)]
+    depth = [np.array([0]), np.ones(len(parent[1]), dtype=np.int64)]
+    first = 1
+    total = 1 + len(parent[1])
+    for d in range(2, max_depth + 1):
+        if total >= units:
+            break
+        frontier = np.arange(first, first + len(parent[-1]))
+        counts = rng.integers(fanout[0], fanout[1] + 1, len(frontier))
+        children = np.repeat(frontier, counts)[:units - total]
+        first += len(frontier)
+        parent.append(children)
+        depth.append(np.full(len(children), d))
+        total += len(children)
+    if total < units:
+        deepest = np.flatnonzero(np.concatenate(depth) == max_depth - 1)
+        extra = rng.choice(deepest, units - total)
+        parent.append(extra)
+        depth.append(np.full(len(extra), max_depth))
+    parent = np.concatenate(parent)
+    depth = np.concatenate(depth)
+    n = len(parent)
+
+    ids = np.array([f'U{i:07d}' for i in range(n)], dtype=object)
+    parent_ids = np.where(parent >= 0, ids[np.maximum(parent, 0)], None).astype(object)
+
+    names = np.empty(n, dtype=object)
+    names[0] = 'BUPATI'
+    for d in range(1, max_depth + 1):
+        rows = np.flatnonzero(depth == d)
+        vocab = NAMA_PER_LEVEL.get(d, NAMA_JABATAN)
+        picks = np.asarray(vocab, dtype=object)[rng.integers(0, len(vocab), len(rows))]
+        names[rows] = [f'{p} {i}' for p, i in zip(picks, rows)]
+
+    structural = (depth >= 1) & (depth <= 3)
+    eselon = np.full(n, None, dtype=object)
+    jenjang = np.full(n, None, dtype=object)
+    for d, mix in eselon_mix.items():
+        rows = np.flatnonzero(depth == d)
+        eselon[rows] = _pick(rng, mix, len(rows))
+        jenjang[rows] = JENJANG_PER_LEVEL[d]
+    jenis = np.where(structural, 'STRUKTURAL', None).astype(object)
+    rows = np.flatnonzero(~structural & (depth > 0))
+    jenis[rows] = _pick(rng, jenis_mix, len(rows))
+
+    # Kerusakan data yang disengaja: atasan hilang, siklus, dan ID ganda
+    orphan = _sample_rows(rng, n, orphan_rate)
+    parent_ids[orphan] = [f'X{i:07d}' for i in orphan]
+    for a in _sample_rows(rng, n, cycle_rate):
+        b = parent[a]
+        if b > 0:
+            parent_ids[b] = ids[a]
+    duplicate = _sample_rows(rng, n, duplicate_rate)
+    ids[duplicate] = ids[duplicate - 1]
+
+    return pd.DataFrame({
+        'ID': ids,
+        'NAMA UNOR': names,
+        'DIATASAN ID': parent_ids,
+        'ESELON': eselon,
+        'JENIS JABATAN': jenis,
+        'JENJANG JABATAN': jenjang,
+        'TOTAL KEBUTUHAN': rng.integers(0, 10, n),
+        'ROOT ID': ids[0],
+        'URUTAN': np.arange(n),
+        'AKTIF': 1,
+    })
+
+def generate_listing(df, rows, missing_rate=0.01, seed=0):
+    # File listing pegawai: ID yang dirujuk diambil acak dari SOTK, sebagian tidak dikenal
+    rng = np.random.default_rng(seed)
+    ids = df['ID'].to_numpy(dtype=object)[rng.integers(0, len(df), rows)]
+    missing = rng.random(rows) < missing_rate
+    ids[missing] = [f'Z{i}' for i in np.flatnonzero(missing)]
+    return pd.DataFrame({'NIP': np.arange(rows).astype(str), 'NAMA': 'PEGAWAI', 'ID': ids})
+
+def parse_mix(pairs):
+    # ['FUNGSIONAL=0.4', 'PELAKSANA=0.6'] -> {'FUNGSIONAL': 0.4, 'PELAKSANA': 0.6}
+    mix = {}
+    for pair in pairs:
+        label, sep, weight = pair.rpartition('=')
+        if not sep or not label:
+            raise argparse.ArgumentTypeError(f"Format campuran harus LABEL=BOBOT: {pair}")
+        mix[label] = float(weight)
+    return mix
+
+def main():
+    parser = argparse.ArgumentParser(description='Buat file SOTK sintetis.')
+    parser.add_argument('--units', type=int, default=10_000)
+    parser.add_argument('--max-depth', type=int, default=7)
+    parser.add_argument('--fanout', type=int, nargs=2, default=(2, 8), metavar=('MIN', 'MAX'))
+    parser.add_argument('--skpd', type=int, default=40)
+    parser.add_argument('--orphan-rate', type=float, default=0.005)
+    parser.add_argument('--cycle-rate', type=float, default=0.0)
+    parser.add_argument('--duplicate-rate', type=float, default=0.0)
+    parser.add_argument('--jenis-mix', nargs='+', metavar='JENIS=BOBOT',
+                        help='Campuran JENIS JABATAN unit non-struktural (default: ' +
+                        ' '.join(f'{k}={v}' for k, v in JENIS_MIX.items()) + ')')
+    parser.add_argument('--eselon-mix', nargs='+', action='append', metavar='ARG',
+                        help='KEDALAMAN KODE=BOBOT ... untuk kedalaman 1-3, mis. --eselon-mix 1 II.a=3 II.b=1 '
+                        '(boleh diulang; default: kode di tiap kedalaman berbobot rata)')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('-o', '--output', required=True, help='File keluaran (.xlsx atau .csv)')
+    args = parser.parse_args()
+
+    try:
+        jenis_mix = parse_mix(args.jenis_mix) if args.jenis_mix else None
+        eselon_mix = {}
+        for level, *pairs in args.eselon_mix or []:
+            if not level.isdigit() or int(level) not in ESELON_PER_LEVEL or not pairs:
+                raise argparse.ArgumentTypeError(f"--eselon-mix butuh KEDALAMAN (1-3) lalu KODE=BOBOT: {level} {' '.join(pairs)}")
+            eselon_mix[int(level)] = parse_mix(pairs)
+    except (argparse.ArgumentTypeError, ValueError) as e:
+        parser.error(str(e))
+
+    df = generate_sotk(
+        args.units, max_depth=args.max_depth, fanout=tuple(args.fanout), skpd=args.skpd,
+        orphan_rate=args.orphan_rate, cycle_rate=args.cycle_rate,
+        duplicate_rate=args.duplicate_rate, jenis_mix=jenis_mix, eselon_mix=eselon_mix, seed=args.seed,
+    )
+    if args.output.lower().endswith('.csv'):
+        df.to_csv(args.output, index=False)
+    else:
+        df.to_excel(args.output, index=False)
+    print(f"{len(df):,} unit ditulis ke {args.output}")
+
+if __name__ == '__main__':
+    main()
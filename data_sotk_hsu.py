@@ -1,10 +1,18 @@
+import os
+import uuid
 import pandas as pd
-import numpy as np
 import streamlit as st
-import io
-import re
-import uuid
 import plotly.express as px
+import plotly.graph_objects as go
+from sotk_core import (
+    EXPORT_CACHE_ENTRIES, EXPORT_CACHE_MAX_BYTES, EXPORT_LARGE_ROWS, XLSX_MIME,
+    JABATAN_ORDER, MAX_LEVELS, SEKTOR_RULES,
+    ARSIP_DIR, ArsipSOTK, ExportCache, NameSearchIndex, RollupCube,
+    build_export_bytes, build_sotk_index, file_fingerprint, iter_listing_chunks,
+    laporan_path, list_bidang, load_sotk_file, sanitize_filename, table_fingerprint, validate_listing,
+)
+from sotk_jobs import SotkJobs
+from sotk_metrics import METRICS
 
 # --- 1. KONFIGURASI HALAMAN ---
 st.set_page_config(
@@ -43,15 +51,27 @@ st.markdown("""
 """, unsafe_allow_html=True)
 
 # --- 2. FUNGSI BANTUAN ---
-def sanitize_filename(name):
-    return re.sub(r'[\\/*?:"<>|]', "_", str(name)).strip()
-
-def tampilkan_dan_download(df_input, file_label, height=None):
+@st.cache_resource
+def get_export_cache():
+    return ExportCache(EXPORT_CACHE_ENTRIES, EXPORT_CACHE_MAX_BYTES)
+
+def lazy_export(df, fmt):
+    cache = get_export_cache()
+    run = METRICS.current_run()
+
+    def build():
+        # Dipanggil saat tombol diklik; catat waktunya ke rerun yang membuat tombol
+        with METRICS.use_run(run):
+            return cache.get_or_build((table_fingerprint(df), fmt), lambda: build_export_bytes(df, fmt))
+    return build
+
+def tampilkan_dan_download(df_input, file_label, height=None, key_prefix=None):
+    # key_prefix membedakan tempat pemanggilan: label sama di dua tabel tidak boleh bentrok
     if df_input.empty:
         st.warning("Data kosong.")
         return
 
-    df_show = df_input.copy()
+    df_show = df_input
     rename_map = {
         'NAMA UNOR': 'Nama Unit Kerja',
         'TOTAL KEBUTUHAN': 'Kebutuhan Pegawai',
@@ -73,79 +93,596 @@ def tampilkan_dan_download(df_input, file_label, height=None):
     st.dataframe(df_show, **dataframe_args)
 
     try:
-        buffer = io.BytesIO()
-        with pd.ExcelWriter(buffer, engine='openpyxl') as writer:
-            df_show.to_excel(writer, index=False, sheet_name='Data')
-        
         safe_label = sanitize_filename(file_label)
-        unique_key = f"btn_{safe_label}_{uuid.uuid4()}"
-        
-        st.download_button(
+        key = f"{key_prefix or 'tabel'}_{file_label}"
+        is_large = len(df_show) > EXPORT_LARGE_ROWS
+        col_xlsx, col_csv = st.columns(2) if is_large else (st.container(), None)
+
+        # Key stabil (bukan uuid) dan data berupa callable: file baru dibuat saat diklik
+        col_xlsx.download_button(
             label=f"📥 Download Excel ({file_label})",
-            data=buffer.getvalue(),
+            data=lazy_export(df_show, 'xlsx'),
             file_name=f"{safe_label}.xlsx",
-            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-            key=unique_key
+            mime=XLSX_MIME,
+            key=f"btn_xlsx_{key}",
+            on_click='ignore'
         )
+        if col_csv is not None:
+            col_csv.download_button(
+                label=f"📄 Download CSV ({file_label})",
+                data=lazy_export(df_show, 'csv'),
+                file_name=f"{safe_label}.csv",
+                mime="text/csv",
+                key=f"btn_csv_{key}",
+                on_click='ignore'
+            )
     except Exception as e:
         st.error(f"Gagal membuat tombol download: {e}")
 
-# --- 3. PROSES DATA ---
-@st.cache_data(show_spinner=False)
-def process_sotk_data(df):
-    df.columns = [str(c).strip().upper() for c in df.columns]
+# --- 3. CACHE BERSAMA ANTAR SESI ---
+# cache_resource: satu salinan per file dibagi ke semua sesi (bukan salinan pickle
+# per rerun seperti cache_data). Hasilnya read-only; tampilan memakai iloc/mask.
+@st.cache_resource(show_spinner=False, max_entries=4)
+def load_sotk(file_key, file_name, _file_bytes):
+    METRICS.incr('cache.sotk.miss')
+    return load_sotk_file(file_key, file_name, _file_bytes)
+
+@st.cache_resource(show_spinner=False, max_entries=8)
+def get_sotk_index(file_key, _df):
+    METRICS.incr('cache.indeks.miss')
+    return build_sotk_index(_df)
+
+@st.cache_resource(show_spinner=False, max_entries=8)
+def get_rollup(file_key, _df):
+    METRICS.incr('cache.rollup.miss')
+    return RollupCube(_df)
+
+@st.cache_resource(show_spinner=False, max_entries=8)
+def get_name_index(file_key, _df):
+    METRICS.incr('cache.indeks_nama.miss')
+    return NameSearchIndex(_df['NAMA UNOR'])
+
+@st.cache_resource(show_spinner=False, max_entries=4)
+def get_validation(file_key, listing_key, listing_name, _listing_bytes, _df, _sotk_index):
+    METRICS.incr('cache.validasi.miss')
+    return validate_listing(iter_listing_chunks(_listing_bytes, listing_name), _df, _sotk_index)
+
+@st.cache_resource
+def get_jobs():
+    return SotkJobs()
+
+@st.fragment(run_every=0.5)
+def pantau_proses(job):
+    # Hanya bagian ini yang diulang selama file diolah di latar belakang
+    if job.done:
+        st.rerun()
+    label, fraction, elapsed = job.progress()
+    st.progress(fraction, text=f"⏳ {label}... ({elapsed:.0f} detik)")
+    st.caption(f"📄 {job.file_name}")
+
+@st.cache_resource
+def get_arsip():
+    return ArsipSOTK(ARSIP_DIR)
+
+# Grafik dibuat sekali per dataset lalu dipakai ulang; figure tidak diubah setelah dibuat.
+# None berarti tidak ada data untuk grafik tersebut.
+SUNBURST_DEPTH = 3
+SUNBURST_FOKUS = ["Fokus Unit Organisasi (Level 2)", "Fokus Bidang (Level 3)"]
+
+@st.cache_resource(show_spinner=False, max_entries=32)
+def get_fig_sunburst(file_key, _cube, focus, top_n):
+    # Dari agregat node di cube (bukan baris data): hanya top_n cabang per node yang dikirim
+    METRICS.incr('grafik.sunburst.miss')
+    nodes = _cube.sunburst_nodes(focus, depth=SUNBURST_DEPTH, top_n=top_n)
+    fig = go.Figure(go.Sunburst(
+        ids=nodes['id'], parents=nodes['parent'], labels=nodes['label'],
+        values=nodes['TOTAL KEBUTUHAN'], branchvalues='total',
+        customdata=nodes[['JUMLAH UNIT']],
+        hovertemplate="<b>%{label}</b><br>Kebutuhan: %{value:,.0f}<br>Jumlah Unit: %{customdata[0]:,.0f}<extra></extra>",
+    ))
+    fig.update_layout(height=700, margin=dict(t=10, l=10, r=10, b=10))
+    return fig
+
+@st.cache_resource(show_spinner=False, max_entries=8)
+def get_fig_top_skpd(file_key, _cube, _valid_skpd):
+    skpd_stats = _cube.skpd_totals()
+    skpd_stats = skpd_stats[skpd_stats['Level 2'].isin(_valid_skpd)][['Level 2', 'TOTAL KEBUTUHAN']]
+    skpd_stats = skpd_stats.sort_values(by='TOTAL KEBUTUHAN', ascending=False).head(10)
+
+    fig_bar = px.bar(
+        skpd_stats, x='TOTAL KEBUTUHAN', y='Level 2', orientation='h',
+        text='TOTAL KEBUTUHAN',
+        color='TOTAL KEBUTUHAN', color_continuous_scale='Viridis', height=400
+    )
+
+    fig_bar.update_traces(textposition='outside')
+    fig_bar.update_layout(yaxis=dict(autorange="reversed"), margin=dict(r=50))
+    return fig_bar
+
+@st.cache_resource(show_spinner=False, max_entries=8)
+def get_fig_jabatan(file_key, _df):
+    jabatan_stats = _df['KELOMPOK_JABATAN'].value_counts(sort=False).reset_index(name='Jumlah')
+    jabatan_stats = jabatan_stats[jabatan_stats['Jumlah'] > 0]
+    if jabatan_stats.empty:
+        return None
+
+    fig_jab = px.bar(
+        jabatan_stats, x='Jumlah', y='KELOMPOK_JABATAN', orientation='h',
+        text='Jumlah',
+        color='KELOMPOK_JABATAN', height=500
+    )
+
+    fig_jab.update_traces(textposition='outside')
+
+    # UPDATE: Paksa Urutan Kategori menggunakan categoryarray + autorange reversed
+    # Ini memastikan 'JABATAN_ORDER[0]' (Eselon II) muncul di PALING ATAS
+    fig_jab.update_layout(
+        showlegend=False, 
+        yaxis=dict(
+            categoryorder='array',
+            categoryarray=JABATAN_ORDER,
+            autorange="reversed" 
+        ),
+        margin=dict(r=50)
+    )
+    return fig_jab
+
+@st.cache_resource(show_spinner=False, max_entries=16)
+def get_fig_sektor(file_key, kolom_sektor, judul_grafik, _df):
+    stats_sektor = _df[kolom_sektor].value_counts(sort=False).reset_index(name='Jumlah Unit')
+    stats_sektor = stats_sektor[stats_sektor['Jumlah Unit'] > 0].rename(columns={kolom_sektor: 'KATEGORI'})
+    if stats_sektor.empty:
+        return None
+
+    fig_sektor = px.bar(
+        stats_sektor, x='KATEGORI', y='Jumlah Unit', text='Jumlah Unit',
+        color='KATEGORI', title=judul_grafik
+    )
+    fig_sektor.update_traces(textposition='outside')
+    return fig_sektor
+
+@st.cache_resource(show_spinner=False, max_entries=4)
+def get_fig_validasi(file_key, listing_key, _grp):
+    grp_sorted = _grp.sort_values(by='Jumlah', ascending=True)
+    fig_val = px.bar(
+        grp_sorted, x='Jumlah', y='Level 2', orientation='h', 
+        title="Distribusi Listing per SKPD", text='Jumlah', height=600
+    )
+    fig_val.update_traces(textposition='outside')
+    fig_val.update_layout(margin=dict(r=50))
+    return fig_val
+
+def panel_laporan(file_key, file_name):
+    st.markdown("##### 📑 Laporan Konsolidasi")
+    jobs = get_jobs()
+    job = jobs.laporan_job(file_key)
+    if job is not None and not job.done:
+        pantau_proses(job)
+        return
+
+    path = laporan_path(file_key)
+    if os.path.exists(path):
+        def baca_laporan():
+            with open(path, 'rb') as f:
+                return f.read()
+        st.download_button(
+            label="📥 Download Laporan Konsolidasi",
+            data=baca_laporan,
+            file_name=f"Laporan_SOTK_{sanitize_filename(os.path.splitext(file_name)[0])}.xlsx",
+            mime=XLSX_MIME,
+            key="btn_laporan",
+            on_click='ignore'
+        )
+        return
+
+    if job is not None and job.error:
+        st.error(job.error)
+    if st.button("Buat Laporan Konsolidasi", key="btn_buat_laporan", use_container_width=True,
+                 help="Rekap semua SKPD, rollup Level 1-6, distribusi jabatan dan temuan integritas dalam satu file Excel."):
+        jobs.submit_laporan(file_key, file_name)
+        st.rerun()
+
+def tampilkan_panel_debug(rerun):
+    # Panel tersembunyi, hanya muncul dengan ?debug=1 di URL
+    with st.sidebar.expander("🛠️ Debug Performa", expanded=True):
+        st.caption(f"Rerun ini: **{rerun['rerun_ms']:,.0f} ms** · RSS proses: **{rerun['rss_mb']:,.0f} MB**")
+        st.dataframe(
+            pd.DataFrame(rerun['stages_ms'].items(), columns=['Tahap', 'ms']).sort_values('ms', ascending=False),
+            hide_index=True, use_container_width=True
+        )
 
-    if 'ID' not in df.columns or 'NAMA UNOR' not in df.columns:
-        return None, "Kolom 'ID' dan 'NAMA UNOR' wajib ada."
+        rates = METRICS.hit_rates()
+        if rates:
+            st.markdown("**Cache hit rate**")
+            st.dataframe(pd.DataFrame(
+                [(k, calls, f"{rate:.0%}") for k, (calls, rate) in sorted(rates.items())],
+                columns=['Cache', 'Panggilan', 'Hit']
+            ), hide_index=True, use_container_width=True)
+
+        st.markdown("**Akumulasi proses**")
+        st.dataframe(pd.DataFrame(
+            [(k, v[0], v[1] * 1000 / v[0], v[2] * 1000) for k, v in sorted(METRICS.stages.items())],
+            columns=['Tahap', 'Panggilan', 'Rata-rata (ms)', 'Maks (ms)']
+        ).round(1), hide_index=True, use_container_width=True)
+
+        riwayat = [r['rerun_ms'] for r in METRICS.reruns]
+        if len(riwayat) > 1:
+            st.markdown("**Latensi rerun terakhir (ms)**")
+            st.line_chart(riwayat[-50:], height=120)
+
+
+# --- 4. ISI TIAP TAB ---
+# Hanya tab yang sedang dibuka yang dijalankan (lihat st.tabs di bawah)
+def reset_fokus_sunburst(level):
+    # Fokus yang lebih dalam tidak berlaku lagi bila induknya berganti
+    for i in range(level + 1, len(SUNBURST_FOKUS)):
+        st.session_state.pop(f"sun_fokus_{i}", None)
+
+def tab_visualisasi(file_key, df, cube, sotk_index, valid_skpd):
+    st.markdown("### 📈 Statistik & Visualisasi")
+
+    # --- 1. SUNBURST CHART ---
+    st.markdown("#### 1. Peta Hierarki Organisasi (Sunburst)")
+
+    if 'Level 2' in df.columns and 'Level 3' in df.columns:
+        # Klik pada Sunburst hanya zoom di browser (tidak mengirim event), jadi
+        # penguraian level yang lebih dalam dipilih lewat fokus di bawah ini
+        focus = ()
+        col_fokus = st.columns(len(SUNBURST_FOKUS) + 1)
+        for i, label in enumerate(SUNBURST_FOKUS):
+            pilihan = [x for x in cube.children(focus)['NAMA'] if x != '-']
+            if not pilihan:
+                break
+            nama = col_fokus[i].selectbox(
+                label, pilihan, index=None, placeholder="Semua", key=f"sun_fokus_{i}",
+                on_change=reset_fokus_sunburst, args=(i,)
+            )
+            if nama is None:
+                break
+            focus += (nama,)
+        top_n = col_fokus[-1].slider("Cabang per node", 5, 30, 12, key="sun_top_n")
+        st.caption(f"👇 Klik lingkaran untuk zoom in. Tiap node menampilkan {top_n} cabang terbesar; sisanya digabung sebagai 'Lainnya'.")
 
-    df['ID'] = df['ID'].astype(str).str.strip()
-    df['NAMA UNOR'] = df['NAMA UNOR'].astype(str).str.lstrip('-')
-    
-    if 'TOTAL KEBUTUHAN' in df.columns:
-        df['TOTAL KEBUTUHAN'] = pd.to_numeric(df['TOTAL KEBUTUHAN'], errors='coerce').fillna(0)
-    
-    if 'DIATASAN ID' in df.columns:
-        df['DIATASAN ID'] = df['DIATASAN ID'].astype(str).str.strip().replace(['nan', 'None', '', 'NaN'], np.nan)
-
-    parent_map = df.set_index('ID')['DIATASAN ID'].to_dict()
-    name_map = df.set_index('ID')['NAMA UNOR'].to_dict()
-
-    orphans = df[df['DIATASAN ID'].notna() & ~df['DIATASAN ID'].isin(df['ID'])].copy()
-
-    def get_lineage(node_id):
-        path = []
-        curr = node_id
-        for _ in range(10):
-            if pd.isna(curr) or curr not in name_map: break
-            path.append(curr)
-            parent = parent_map.get(curr)
-            if pd.isna(parent) or parent == curr: break
-            curr = parent
-        return path[::-1]
-
-    df['hierarchy_path'] = df['ID'].apply(get_lineage)
-
-    hierarchy_df = pd.DataFrame(df['hierarchy_path'].tolist(), index=df.index)
-    hierarchy_df = hierarchy_df.iloc[:, :6] 
-    hierarchy_df.columns = [f'Level {i+1}' for i in range(hierarchy_df.shape[1])]
-    
-    df = pd.concat([df, hierarchy_df], axis=1)
+        try:
+            with METRICS.stage('grafik.sunburst'):
+                st.plotly_chart(get_fig_sunburst(file_key, cube, focus, top_n), use_container_width=True)
+        except Exception as e:
+            st.warning(f"Data belum cukup untuk Sunburst: {e}")
 
-    level_cols = [c for c in df.columns if c.startswith('Level ')]
-    for col in level_cols:
-        df[col] = df[col].map(name_map).fillna('-')
+    st.divider()
 
-    if 'DIATASAN ID' in df.columns:
-        df['NAMA ATASAN'] = df['DIATASAN ID'].map(name_map).fillna('-')
-    
-    drop_cols = ['DIATASAN ID', 'ROOT ID', 'ROW LEVEL', 'URUTAN', 'AKTIF', 'CORDER', 'INDUK UNOR ID', 'hierarchy_path']
-    df = df.drop(columns=[c for c in drop_cols if c in df.columns])
+    # --- 2. TOP 10 SKPD ---
+    st.markdown("#### 2. Top 10 SKPD (Kebutuhan Pegawai)")
+    st.caption("👇 Klik batang grafik untuk melihat detail.")
+
+    if 'Level 2' in df.columns:
+        fig_bar = get_fig_top_skpd(file_key, cube, valid_skpd)
+        event_skpd = st.plotly_chart(fig_bar, use_container_width=True, on_select="rerun")
+
+        selected_skpd = None
+        if event_skpd and len(event_skpd['selection']['points']) > 0:
+            selected_skpd = event_skpd['selection']['points'][0]['y']
 
-    return df, orphans
+        if selected_skpd:
+            st.info(f"📂 Detail Data: **{selected_skpd}**")
+            detail_skpd = df.iloc[sotk_index['Level 2'].positions(selected_skpd)]
+            tampilkan_dan_download(detail_skpd, f"Detail_{selected_skpd}", key_prefix="skpd")
+
+    st.divider()
+
+    # --- 3. DISTRIBUSI JABATAN ---
+    st.markdown("#### 3. Distribusi Jabatan")
+    st.caption("👇 Klik batang grafik untuk melihat daftar pegawai/jabatan.")
+
+    if 'ESELON' in df.columns and 'JENIS JABATAN' in df.columns:
+        fig_jab = get_fig_jabatan(file_key, df)
+
+        if fig_jab is not None:
+            event_jab = st.plotly_chart(fig_jab, use_container_width=True, on_select="rerun")
+
+            selected_jabatan = None
+            if event_jab and len(event_jab['selection']['points']) > 0:
+                selected_jabatan = event_jab['selection']['points'][0]['y']
+
+            if selected_jabatan:
+                st.info(f"📂 Detail Data: **{selected_jabatan}**")
+                detail_jab = df.iloc[sotk_index['KELOMPOK_JABATAN'].positions(selected_jabatan)]
+                tampilkan_dan_download(detail_jab, f"Detail_{selected_jabatan}", key_prefix="jabatan")
+        else:
+            st.warning("Tidak ada data jabatan yang sesuai kriteria.")
+    else:
+        st.error("Kolom 'ESELON' atau 'JENIS JABATAN' tidak ditemukan.")
+
+    st.divider()
+
+    # --- 4. STATISTIK SEKTORAL ---
+    st.markdown("#### 4. Statistik Sektoral (Unit Kerja)")
+    st.caption("👇 Klik batang grafik untuk melihat daftar unit kerja.")
+
+    # Judul per grup sektor; grup baru di SEKTOR_RULES otomatis ikut tampil
+    sektor_tampilan = {
+        'PENDIDIKAN': ("Pendidikan (Jumlah Sekolah)", "Jumlah Sekolah", "Tidak ditemukan data sekolah."),
+        'KESEHATAN': ("Kesehatan (Fasilitas)", "Fasilitas Kesehatan", "Tidak ditemukan data kesehatan."),
+    }
+    sektor_cols = st.columns(len(SEKTOR_RULES))
+
+    for i, (grup, col_sec) in enumerate(zip(SEKTOR_RULES, sektor_cols)):
+        judul, judul_grafik, pesan_kosong = sektor_tampilan.get(
+            grup, (grup.title(), f"Unit {grup.title()}", f"Tidak ditemukan data {grup.lower()}.")
+        )
+        kolom_sektor = f'SEKTOR {grup}'
+
+        with col_sec:
+            st.markdown(f"**{chr(ord('A') + i)}. {judul}**")
+            fig_sektor = get_fig_sektor(file_key, kolom_sektor, judul_grafik, df)
+
+            if fig_sektor is not None:
+                event_sektor = st.plotly_chart(fig_sektor, use_container_width=True, on_select="rerun", key=f"chart_{kolom_sektor}")
+                selected_sektor = None
+                if event_sektor and len(event_sektor['selection']['points']) > 0:
+                    selected_sektor = event_sektor['selection']['points'][0]['x']
+
+                if selected_sektor:
+                    st.info(f"📂 Detail Data: **{selected_sektor}**")
+                    detail_sektor = df.iloc[sotk_index[kolom_sektor].positions(selected_sektor)]
+                    tampilkan_dan_download(detail_sektor, f"Detail_{selected_sektor}", key_prefix="sektor")
+            else:
+                st.info(pesan_kosong)
+
+def tab_struktur_skpd(df, cube, sotk_index, valid_skpd):
+    if 'Level 2' in df.columns:
+        sorted_skpd = sorted(valid_skpd)
+        col_filter, col_view = st.columns([1, 3])
+        with col_filter:
+            pilihdinas = st.selectbox("Pilih Unit Organisasi (Level 2)", sorted_skpd, key="pilih_skpd")
+
+        with col_view:
+            if pilihdinas:
+                m1, m2 = st.columns(2)
+                m1.metric(f"Kebutuhan {pilihdinas}", f"{int(cube.under_skpd(pilihdinas, 2)['TOTAL KEBUTUHAN'].sum())}")
+                if 'Level 3' in df.columns:
+                    m2.metric("Jumlah Bidang/Bagian", f"{len(list_bidang(sotk_index, pilihdinas))}")
+
+                agg_cols = [c for c in ['Level 3', 'Level 4', 'Level 5', 'Level 6'] if c in df.columns]
+                if agg_cols:
+                    st.markdown("##### 📋 Rekapitulasi Struktur")
+                    view_df = cube.recap(pilihdinas, agg_cols)
+                    tampilkan_dan_download(view_df, f"Rekap_{pilihdinas}", key_prefix="rekap_dinas")
+
+                    if 'Level 3' in df.columns:
+                        st.divider()
+                        st.markdown("##### 📂 Detail per Bidang")
+                        unique_bidang = sorted([x for x in list_bidang(sotk_index, pilihdinas) if str(x) != '-' and str(x) != 'nan'])
+                        pilihbidang = st.selectbox("Filter Bidang (Level 3)", unique_bidang, index=None)
+
+                        if pilihbidang:
+                            bidang_view = view_df[view_df['Level 3'] == pilihbidang]
+                            tot_bid = bidang_view['TOTAL KEBUTUHAN'].sum()
+                            st.metric(f"Total Kebutuhan: {pilihbidang}", int(tot_bid))
+                            tampilkan_dan_download(bidang_view, f"Detail_{pilihbidang}", key_prefix="rekap_bidang")
+
+def tab_data_master(df, name_index):
+    st.markdown("### 📂 Data Master Keseluruhan")
+    # Kueri berisi spasi saja dianggap kosong (setelah normalisasi akan cocok ke semua baris)
+    filter_nama = st.text_input("Cari nama unit kerja:", key="filter_master").strip()
+    df_display = df
+    if filter_nama:
+        df_display = df.iloc[name_index.search(filter_nama)]
+    st.caption(f"Menampilkan {len(df_display)} baris data.")
+    tampilkan_dan_download(df_display, "Master_Data_SOTK")
+
+def tab_cari_id(df, sotk_index):
+    cari_id = st.text_input("Masukkan ID Unor:", key="cari_id")
+    if cari_id:
+        res = df.iloc[sotk_index['ID'].positions(cari_id)]
+        if not res.empty:
+            st.success("ID Ditemukan")
+            tampilkan_dan_download(res, f"Search_ID_{cari_id}", key_prefix="cari_id")
+        else:
+            st.warning("ID Tidak Ditemukan")
+
+def tab_cari_nama(df, name_index):
+    cari_nama_tab = st.text_input("Cari Nama Jabatan / Unit:", key="cari_nama").strip()
+    col_opt1, col_opt2 = st.columns(2)
+    awalan_saja = col_opt1.checkbox("Hanya nama yang diawali kata kunci", key="cari_prefix")
+    mode_mirip = col_opt2.checkbox("Pencarian mirip (toleran salah ketik, diurutkan relevansi)", key="cari_fuzzy")
+    if cari_nama_tab:
+        if mode_mirip:
+            res = df.iloc[name_index.search_fuzzy(cari_nama_tab)]
+        else:
+            res = df.iloc[name_index.search(cari_nama_tab, prefix=awalan_saja)]
+        if not res.empty:
+            st.info(f"Ditemukan {len(res)} data")
+            total_keb_cari = res['TOTAL KEBUTUHAN'].sum()
+            st.metric("Total Kebutuhan (Hasil Pencarian)", int(total_keb_cari))
+
+            cols_show = ['NAMA UNOR'] + [c for c in df.columns if c.startswith('Level ')] + ['TOTAL KEBUTUHAN']
+            cols_show = [c for c in cols_show if c in res.columns]
+            tampilkan_dan_download(res[cols_show], f"Search_Nama_{cari_nama_tab}", key_prefix="cari_nama")
+        else:
+            st.warning("Tidak ditemukan")
+
+def tab_validasi(file_key, df, sotk_index, orphans, laporan_hierarki, tabel, file_list):
+    perubahan = tabel['perubahan']
+    if perubahan is not None:
+        with st.expander(f"📝 Perubahan dari versi sebelumnya ({laporan_hierarki.get('pembanding', '-')})"):
+            ringkasan = perubahan.groupby('PERUBAHAN', observed=False).agg(
+                Jumlah=('ID', 'size'), Selisih_Kebutuhan=('SELISIH KEBUTUHAN', 'sum')
+            ).reset_index()
+            st.dataframe(ringkasan, use_container_width=True, hide_index=True)
+            st.caption(f"Level disusun ulang untuk {laporan_hierarki.get('baris_dihitung', len(df)):,} dari {len(df):,} baris.")
+            tampilkan_dan_download(perubahan, "Perubahan_SOTK")
+
+    st.markdown("### 🩺 Integritas Struktur")
+    akar = tabel['akar']
+    i1, i2, i3, i4, i5 = st.columns(5)
+    i1.metric("Unit Yatim", f"{len(orphans):,}")
+    i2.metric("Siklus", f"{tabel['siklus']['SIKLUS'].nunique():,}")
+    i3.metric("ID Ganda", f"{len(tabel['duplikat']):,}")
+    i4.metric(f"Melebihi Level {MAX_LEVELS}", f"{len(tabel['kedalaman']):,}")
+    i5.metric("Pohon Terpisah", f"{max(len(akar) - 1, 0):,}")
+
+    integritas = [
+        ("👤 Unit yatim (atasan tidak ditemukan)", orphans, "Integritas_Yatim"),
+        ("🔁 Anggota siklus", tabel['siklus'], "Integritas_Siklus"),
+        ("🆔 ID ganda (atasan diambil dari baris terakhir)", tabel['duplikat'], "Integritas_ID_Ganda"),
+        (f"📏 Melebihi Level {MAX_LEVELS}", tabel['kedalaman'], "Integritas_Kedalaman"),
+        ("🌳 Akar & pohon terpisah", akar, "Integritas_Akar"),
+    ]
+    for judul, data, label in integritas:
+        if not data.empty:
+            with st.expander(f"{judul} — {len(data):,} baris"):
+                tampilkan_dan_download(data, label, key_prefix="integritas")
+    st.divider()
+
+    st.markdown("### 🔄 Validasi Data Listing")
+    if file_list is None:
+        st.info("Upload file listing di panel sebelah kiri untuk memvalidasi ID terhadap SOTK.")
+
+    if file_list and 'Level 2' in df.columns:
+        try:
+            listing_bytes = file_list.getvalue()
+            listing_key = file_fingerprint(listing_bytes)
+            with METRICS.stage('cache.validasi'):
+                validasi = get_validation(file_key, listing_key, file_list.name, listing_bytes, df, sotk_index)
+            df_merge = validasi['listing']
+            grp = validasi['rekap_skpd']
+
+            st.markdown("#### 📊 Rekapitulasi Validasi")
+            if not grp.empty:
+                st.plotly_chart(get_fig_validasi(file_key, listing_key, grp), use_container_width=True)
+
+            tampilkan_dan_download(grp, "Rekap_Validasi_Listing")
+
+            unmatched = validasi['unmatched']
+            if not unmatched.empty:
+                with st.expander(f"⚠️ {int(unmatched['Jumlah Baris'].sum()):,} baris listing ({len(unmatched):,} ID) tidak ditemukan di SOTK"):
+                    tampilkan_dan_download(unmatched, "ID_Listing_Tidak_Ditemukan")
+            st.divider()
+
+            st.markdown("#### 📂 Detail Data Listing")
+            list_dinas = sorted([x for x in grp['Level 2'] if pd.notna(x) and str(x) != '-' and str(x) != 'nan'])
+            pilih_dinas_val = st.selectbox("Pilih Unit Organisasi (Listing):", list_dinas, index=None, key="pilih_skpd_listing")
+
+            if pilih_dinas_val:
+                detail_val = df_merge.iloc[validasi['index']['Level 2'].positions(pilih_dinas_val)]
+                tampilkan_dan_download(detail_val, f"Listing_{pilih_dinas_val}", key_prefix="validasi_dinas")
+
+                if 'rekap_bidang' in validasi:
+                    rekap_bidang = validasi['rekap_bidang']
+                    bidang_dinas = rekap_bidang.loc[rekap_bidang['Level 2'] == pilih_dinas_val, 'Level 3']
+                    daftar_bidang = sorted([x for x in bidang_dinas if pd.notna(x) and str(x) != '-' and str(x) != 'nan'])
+                    if daftar_bidang:
+                        pilih_bidang_val = st.selectbox("Pilih Bidang (Listing):", daftar_bidang, index=None)
+                        if pilih_bidang_val:
+                            posisi = validasi['index']['Level 3'].positions((pilih_dinas_val, pilih_bidang_val))
+                            tampilkan_dan_download(df_merge.iloc[posisi], f"Listing_{pilih_bidang_val}", key_prefix="validasi_bidang")
+
+        except Exception as e:
+            st.error(f"Terjadi kesalahan pada file listing: {e}")
+
+def tab_arsip(file_key, file_name, df):
+    st.markdown("### 📅 Arsip & Tren Antar Periode")
+    st.caption("Simpan SOTK yang sedang dibuka sebagai snapshot periode, lalu bandingkan kebutuhan antar periode tanpa membuka ulang file Excel lama.")
+    arsip = get_arsip()
+    sumber = file_key.split('_', 1)[0]
+
+    col_periode, col_simpan = st.columns([3, 1])
+    periode = col_periode.text_input("Periode data ini (TTTT atau TTTT-BB):", key="arsip_periode", placeholder="mis. 2025 atau 2025-06")
+    col_simpan.markdown("<br>", unsafe_allow_html=True)
+    if col_simpan.button("💾 Simpan ke Arsip", disabled=not periode):
+        try:
+            sudah_ada = periode in set(arsip.periods()['periode'])
+            arsip.save(periode, df, sumber, file_name)
+            st.success(f"Periode **{periode}** {'diperbarui' if sudah_ada else 'disimpan'} di arsip.")
+        except ValueError as e:
+            st.error(str(e))
+
+    tersimpan = [p for p in arsip.find_source(sumber) if p != periode]
+    if tersimpan:
+        st.info(f"File ini sudah ada di arsip sebagai periode **{', '.join(tersimpan)}**.")
+
+    daftar = arsip.periods()
+    if daftar.empty:
+        st.info("Arsip masih kosong.")
+        return
+
+    with st.expander(f"🗄️ Isi arsip — {len(daftar)} periode"):
+        st.dataframe(daftar.rename(columns={
+            'periode': 'Periode', 'nama_file': 'Nama File', 'baris': 'Jumlah Unit',
+            'total_kebutuhan': 'Total Kebutuhan', 'sumber': 'SHA-256 File', 'dibuat': 'Disimpan',
+        }), use_container_width=True, hide_index=True)
+        hapus = st.selectbox("Hapus periode:", daftar['periode'], index=None, key="arsip_hapus")
+        if hapus and st.button(f"🗑️ Hapus {hapus}"):
+            arsip.delete(hapus)
+            st.rerun()
+
+    st.divider()
+    st.markdown("#### 1. Kebutuhan per SKPD antar Periode")
+    with METRICS.stage('arsip.kebutuhan_per_skpd'):
+        tren = arsip.kebutuhan_per_skpd()
+    periode_cols = list(daftar['periode'])
+    pilih_skpd = st.multiselect("SKPD:", tren['Level 2'], default=list(tren['Level 2'][:8]), key="arsip_skpd")
+    if pilih_skpd:
+        tren_long = tren[tren['Level 2'].isin(pilih_skpd)].melt(
+            id_vars='Level 2', value_vars=periode_cols, var_name='Periode', value_name='TOTAL KEBUTUHAN'
+        )
+        fig_tren = px.line(tren_long, x='Periode', y='TOTAL KEBUTUHAN', color='Level 2', markers=True, height=450)
+        fig_tren.update_xaxes(type='category')
+        st.plotly_chart(fig_tren, use_container_width=True)
+    tampilkan_dan_download(tren, "Tren_Kebutuhan_SKPD")
+
+    st.divider()
+    st.markdown("#### 2. Unit Baru & Dihapus per Periode")
+    with METRICS.stage('arsip.perubahan_unit'):
+        perubahan_periode = arsip.perubahan_unit()
+    if len(perubahan_periode) > 1:
+        fig_unit = px.bar(
+            perubahan_periode.iloc[1:].melt(id_vars='PERIODE', value_vars=['BARU', 'DIHAPUS'], var_name='Perubahan', value_name='Jumlah Unit'),
+            x='PERIODE', y='Jumlah Unit', color='Perubahan', barmode='group', text='Jumlah Unit', height=400
+        )
+        fig_unit.update_xaxes(type='category')
+        st.plotly_chart(fig_unit, use_container_width=True)
+    tampilkan_dan_download(perubahan_periode, "Perubahan_Unit_per_Periode")
+
+    if len(periode_cols) > 1:
+        pilih_rincian = st.selectbox("Rincian perubahan periode:", periode_cols[1:], index=None, key="arsip_rincian")
+        if pilih_rincian:
+            sebelumnya = periode_cols[periode_cols.index(pilih_rincian) - 1]
+            st.caption(f"Dibandingkan dengan periode {sebelumnya}.")
+            tampilkan_dan_download(arsip.rincian_perubahan(sebelumnya, pilih_rincian), f"Rincian_Perubahan_{pilih_rincian}", key_prefix="arsip_rincian")
+
+    st.divider()
+    st.markdown("#### 3. Riwayat Unit Kerja")
+    cari_riwayat = st.text_input("Masukkan ID Unor:", key="arsip_id")
+    if cari_riwayat:
+        riwayat = arsip.riwayat_id(cari_riwayat)
+        if riwayat.empty:
+            st.warning("ID tidak ditemukan di arsip.")
+        else:
+            tampilkan_dan_download(riwayat, f"Riwayat_{cari_riwayat}", key_prefix="arsip_riwayat")
+
+# --- 5. LOGIKA UTAMA ---
+debug_mode = st.query_params.get('debug') == '1'
+METRICS.begin_run(force=debug_mode)
+
+# Widget di tab yang tidak terbuka tidak dirender sehingga nilainya dibuang Streamlit;
+# tulis ulang ke session_state agar isian tetap ada saat kembali ke tab tersebut
+TAB_WIDGET_KEYS = (
+    'sun_fokus_0', 'sun_fokus_1', 'sun_top_n', 'pilih_skpd', 'filter_master',
+    'cari_id', 'cari_nama', 'cari_prefix', 'cari_fuzzy', 'pilih_skpd_listing',
+    'arsip_periode', 'arsip_skpd', 'arsip_rincian', 'arsip_id',
+)
+for widget_key in TAB_WIDGET_KEYS:
+    if widget_key in st.session_state:
+        st.session_state[widget_key] = st.session_state[widget_key]
+
+sesi_id = st.session_state.setdefault('sesi_id', uuid.uuid4().hex)
 
-# --- 4. LOGIKA UTAMA ---
 st.sidebar.header("📂 Panel Kontrol")
 file_sotk = st.sidebar.file_uploader("Upload File SOTK", type=['xlsx', 'xls', 'csv'])
+# Di sidebar (bukan di tab Validasi) agar file tetap ada saat pindah tab
+file_list = st.sidebar.file_uploader("Upload File Listing", type=['xlsx', 'xls', 'csv'], key='list_up', help="Opsional, untuk tab Validasi.")
 st.sidebar.caption("Developed by Rezal Dewantara")
 
 st.title("📊 Dashboard Analisis SOTK")
@@ -153,395 +690,117 @@ st.subheader("Pemerintah Kabupaten Hulu Sungai Utara")
 st.markdown("---")
 
 if file_sotk is not None:
-    try:
-        if file_sotk.name.endswith('.csv'):
-            raw_df = pd.read_csv(file_sotk)
-        else:
-            raw_df = pd.read_excel(file_sotk)
-    except Exception as e:
-        st.error(f"Gagal membaca file: {e}")
+    file_bytes = file_sotk.getvalue()
+    file_key = file_fingerprint(file_bytes)
+
+    # Baca & olah file di worker latar belakang; upload identik dari sesi lain memakai job
+    # yang sama, dan upload baru di sesi ini membatalkan job lama yang belum berjalan
+    job = get_jobs().submit(sesi_id, file_key, file_sotk.name, file_bytes)
+    if not job.wait(0.5):  # file kecil / sudah di cache biasanya selesai dalam sekejap
+        pantau_proses(job)
+        st.stop()
+    if job.error:
+        st.error(job.error)
         st.stop()
 
-    with st.spinner('Sedang memproses struktur organisasi...'):
-        df, orphans = process_sotk_data(raw_df)
+    with st.spinner('Memuat hasil olahan...'):
+        with METRICS.stage('cache.sotk'):
+            df, orphans, laporan_hierarki, tabel = load_sotk(file_key, file_sotk.name, file_bytes)
         
         if df is None:
             st.error(orphans)
             st.stop()
 
+        with METRICS.stage('cache.indeks'):
+            sotk_index = get_sotk_index(file_key, df)
+        with METRICS.stage('cache.indeks_nama'):
+            name_index = get_name_index(file_key, df)
+        with METRICS.stage('cache.rollup'):
+            cube = get_rollup(file_key, df)
+
+    with st.sidebar:
+        st.divider()
+        panel_laporan(file_key, file_sotk.name)
+
     if not orphans.empty:
         with st.sidebar:
             st.warning(f"⚠️ Ditemukan **{len(orphans)}** unit kerja 'Yatim'.")
 
+    if laporan_hierarki['cyclic_ids']:
+        with st.sidebar:
+            st.warning(f"🔁 Ditemukan **{len(laporan_hierarki['cyclic_ids'])}** unit kerja dengan rantai atasan melingkar (siklus).")
+
+    if not tabel['duplikat'].empty:
+        with st.sidebar:
+            st.warning(f"🆔 Ditemukan **{len(tabel['duplikat'])}** ID ganda.")
+
+    if laporan_hierarki['overflow_ids']:
+        with st.sidebar:
+            st.caption(f"ℹ️ {len(laporan_hierarki['overflow_ids'])} unit berada lebih dalam dari Level {MAX_LEVELS} (kedalaman maks: {laporan_hierarki['max_depth'] + 1}).")
+
+    perubahan = tabel['perubahan']
+    if perubahan is not None:
+        jumlah = perubahan['PERUBAHAN'].value_counts()
+        with st.sidebar:
+            st.info(
+                f"🆕 Dibandingkan dengan **{laporan_hierarki.get('pembanding', 'versi sebelumnya')}**: "
+                f"{jumlah['BARU']:,} baru, {jumlah['DIHAPUS']:,} dihapus, "
+                f"{jumlah['PINDAH']:,} pindah, {jumlah['GANTI NAMA']:,} ganti nama."
+            )
+
     # --- METRICS UTAMA ---
     c1, c2, c3 = st.columns(3)
-    c1.metric("Total Jabatan/Unit", f"{len(df):,}")
-    c2.metric("Total Kebutuhan", f"{int(df['TOTAL KEBUTUHAN'].sum()):,}")
+    c1.metric("Total Jabatan/Unit", f"{cube.total_unit:,}")
+    c2.metric("Total Kebutuhan", f"{int(cube.total_kebutuhan):,}")
     
     if 'Level 2' in df.columns:
-        skpd_raw = df['Level 2'].unique()
-        valid_skpd = [
-            x for x in skpd_raw 
-            if str(x) != '-' 
-            and str(x).lower() != 'nan'
-            and 'BUPATI' not in str(x).upper()
-            and 'WAKIL' not in str(x).upper()
-        ]
+        valid_skpd = cube.valid_skpd()
         c3.metric("Jumlah SKPD", f"{len(valid_skpd)}")
     else:
+        valid_skpd = []
         c3.metric("Jumlah SKPD", "0")
 
     st.markdown("---")
 
+
     # --- TABS ---
-    tab1, tab2, tab3, tab4, tab5, tab6 = st.tabs([
+    # on_change="rerun": hanya isi tab yang terbuka yang dihitung pada tiap rerun
+    t_vis, t_skpd, t_master, t_id, t_nama, t_val, t_arsip = st.tabs([
         "📈 Visualisasi", 
         "🏢 Struktur SKPD", 
         "📂 Data Master", 
         "🔍 Cari ID", 
         "🔎 Cari Nama", 
-        "✅ Validasi"
-    ])
-
-    # === TAB 1: VISUALISASI ===
-    with tab1:
-        st.markdown("### 📈 Statistik & Visualisasi")
-
-        # --- 1. SUNBURST CHART ---
-        st.markdown("#### 1. Peta Hierarki Organisasi (Sunburst)")
-        st.caption("👇 Klik lingkaran dalam untuk zoom in.")
-        
-        if 'Level 2' in df.columns and 'Level 3' in df.columns:
-            df_sun = df[(df['Level 2'] != '-') & (df['Level 2'].notna())].copy()
-            try:
-                fig_sun = px.sunburst(
-                    df_sun, 
-                    path=['Level 2', 'Level 3', 'Level 4'], 
-                    values='TOTAL KEBUTUHAN',
-                    color='Level 2', 
-                    height=700
-                )
-                st.plotly_chart(fig_sun, use_container_width=True)
-            except Exception as e:
-                st.warning(f"Data belum cukup untuk Sunburst: {e}")
-        
-        st.divider()
-
-        # --- 2. TOP 10 SKPD ---
-        st.markdown("#### 2. Top 10 SKPD (Kebutuhan Pegawai)")
-        st.caption("👇 Klik batang grafik untuk melihat detail.")
-        
-        if 'Level 2' in df.columns:
-            skpd_df = df[df['Level 2'].isin(valid_skpd)]
-            skpd_stats = skpd_df.groupby('Level 2')['TOTAL KEBUTUHAN'].sum().reset_index()
-            skpd_stats = skpd_stats.sort_values(by='TOTAL KEBUTUHAN', ascending=False).head(10)
-            
-            fig_bar = px.bar(
-                skpd_stats, x='TOTAL KEBUTUHAN', y='Level 2', orientation='h',
-                text='TOTAL KEBUTUHAN',
-                color='TOTAL KEBUTUHAN', color_continuous_scale='Viridis', height=400
-            )
-            
-            fig_bar.update_traces(textposition='outside')
-            fig_bar.update_layout(yaxis=dict(autorange="reversed"), margin=dict(r=50))
-
-            event_skpd = st.plotly_chart(fig_bar, use_container_width=True, on_select="rerun")
-            
-            selected_skpd = None
-            if event_skpd and len(event_skpd['selection']['points']) > 0:
-                selected_skpd = event_skpd['selection']['points'][0]['y']
-            
-            if selected_skpd:
-                st.info(f"📂 Detail Data: **{selected_skpd}**")
-                detail_skpd = df[df['Level 2'] == selected_skpd].copy()
-                tampilkan_dan_download(detail_skpd, f"Detail_{selected_skpd}")
-
-        st.divider()
-
-        # --- 3. DISTRIBUSI JABATAN ---
-        st.markdown("#### 3. Distribusi Jabatan")
-        st.caption("👇 Klik batang grafik untuk melihat daftar pegawai/jabatan.")
-        
-        if 'ESELON' in df.columns and 'JENIS JABATAN' in df.columns:
-            def klasifikasi_jabatan_smart(row):
-                eselon = str(row['ESELON']).strip().upper() if pd.notna(row['ESELON']) else ''
-                jenis = str(row['JENIS JABATAN']).strip().upper() if pd.notna(row['JENIS JABATAN']) else ''
-                jenjang = str(row['JENJANG JABATAN']).strip().upper() if 'JENJANG JABATAN' in row and pd.notna(row['JENJANG JABATAN']) else ''
-
-                if ('II' in eselon) or (eselon in ['21', '22']) or ('PIMPINAN TINGGI' in jenjang):
-                    return 'JABATAN PIMPINAN TINGGI PRATAMA (Eselon II)'
-                elif ('III' in eselon) or (eselon in ['31', '32']) or ('ADMINISTRATOR' in jenjang):
-                    return 'JABATAN ADMINISTRATOR (Eselon III)'
-                elif ('IV' in eselon) or (eselon in ['41', '42']) or ('PENGAWAS' in jenjang):
-                    return 'JABATAN PENGAWAS (Eselon IV)'
-                if 'PELAKSANA' in jenis or 'PELAKSANA' in jenjang or 'FUNGSIONAL UMUM' in jenis:
-                    return 'JABATAN PELAKSANA'
-                if 'FUNGSIONAL' in jenis or 'FUNGSIONAL' in jenjang:
-                    return 'JABATAN FUNGSIONAL'
-                return None
-
-            df_viz = df.copy()
-            df_viz['KELOMPOK_JABATAN'] = df_viz.apply(klasifikasi_jabatan_smart, axis=1)
-            df_viz = df_viz.dropna(subset=['KELOMPOK_JABATAN'])
-            
-            jabatan_stats = df_viz.groupby('KELOMPOK_JABATAN').size().reset_index(name='Jumlah')
-            
-            # URUTAN TAMPILAN YANG DIINGINKAN (TOP to BOTTOM)
-            urutan_custom = [
-                'JABATAN PIMPINAN TINGGI PRATAMA (Eselon II)', 
-                'JABATAN ADMINISTRATOR (Eselon III)',
-                'JABATAN PENGAWAS (Eselon IV)', 
-                'JABATAN FUNGSIONAL', 
-                'JABATAN PELAKSANA'
-            ]
-            
-            # Terapkan categorical sorting
-            jabatan_stats['KELOMPOK_JABATAN'] = pd.Categorical(
-                jabatan_stats['KELOMPOK_JABATAN'], 
-                categories=urutan_custom, 
-                ordered=True
-            )
-            jabatan_stats = jabatan_stats.sort_values('KELOMPOK_JABATAN')
-
-            if not jabatan_stats.empty:
-                fig_jab = px.bar(
-                    jabatan_stats, x='Jumlah', y='KELOMPOK_JABATAN', orientation='h',
-                    text='Jumlah',
-                    color='KELOMPOK_JABATAN', height=500
-                )
-                
-                fig_jab.update_traces(textposition='outside')
-                
-                # UPDATE: Paksa Urutan Kategori menggunakan categoryarray + autorange reversed
-                # Ini memastikan 'urutan_custom[0]' (Eselon II) muncul di PALING ATAS
-                fig_jab.update_layout(
-                    showlegend=False, 
-                    yaxis=dict(
-                        categoryorder='array',
-                        categoryarray=urutan_custom,
-                        autorange="reversed" 
-                    ),
-                    margin=dict(r=50)
-                )
-                
-                event_jab = st.plotly_chart(fig_jab, use_container_width=True, on_select="rerun")
-                
-                selected_jabatan = None
-                if event_jab and len(event_jab['selection']['points']) > 0:
-                    selected_jabatan = event_jab['selection']['points'][0]['y']
-                
-                if selected_jabatan:
-                    st.info(f"📂 Detail Data: **{selected_jabatan}**")
-                    detail_jab = df_viz[df_viz['KELOMPOK_JABATAN'] == selected_jabatan].copy()
-                    tampilkan_dan_download(detail_jab, f"Detail_{selected_jabatan}")
-            else:
-                st.warning("Tidak ada data jabatan yang sesuai kriteria.")
-        else:
-            st.error("Kolom 'ESELON' atau 'JENIS JABATAN' tidak ditemukan.")
-
-        st.divider()
-
-        # --- 4. STATISTIK SEKTORAL ---
-        st.markdown("#### 4. Statistik Sektoral (Unit Kerja)")
-        st.caption("👇 Klik batang grafik untuk melihat daftar unit kerja.")
-        col_sec1, col_sec2 = st.columns(2)
-
-        # A. PENDIDIKAN
-        with col_sec1:
-            st.markdown("**A. Pendidikan (Jumlah Sekolah)**")
-            def cek_pendidikan(nama):
-                n = str(nama).upper()
-                if 'TK ' in n or n.startswith('TK ') or 'TAMAN KANAK' in n: return 'TK'
-                if 'SD ' in n or n.startswith('SD ') or 'SEKOLAH DASAR' in n: return 'SD'
-                if 'SMP ' in n or n.startswith('SMP ') or 'SEKOLAH MENENGAH' in n: return 'SMP'
-                return None
-
-            df_pend = df.copy()
-            df_pend['KATEGORI'] = df_pend['NAMA UNOR'].apply(cek_pendidikan)
-            df_pend = df_pend.dropna(subset=['KATEGORI'])
-            
-            if not df_pend.empty:
-                stats_pend = df_pend.groupby('KATEGORI').size().reset_index(name='Jumlah Unit')
-                urutan_pend = ['TK', 'SD', 'SMP']
-                stats_pend['KATEGORI'] = pd.Categorical(stats_pend['KATEGORI'], categories=urutan_pend, ordered=True)
-                stats_pend = stats_pend.sort_values('KATEGORI')
-
-                fig_pend = px.bar(
-                    stats_pend, x='KATEGORI', y='Jumlah Unit', text='Jumlah Unit',
-                    color='KATEGORI', title="Jumlah Sekolah"
-                )
-                fig_pend.update_traces(textposition='outside')
-                
-                event_pend = st.plotly_chart(fig_pend, use_container_width=True, on_select="rerun")
-                selected_pend = None
-                if event_pend and len(event_pend['selection']['points']) > 0:
-                    selected_pend = event_pend['selection']['points'][0]['x']
-                
-                if selected_pend:
-                    st.info(f"📂 Detail Data: **{selected_pend}**")
-                    detail_pend = df_pend[df_pend['KATEGORI'] == selected_pend].copy()
-                    tampilkan_dan_download(detail_pend, f"Detail_{selected_pend}")
-            else:
-                st.info("Tidak ditemukan data sekolah.")
-
-        # B. KESEHATAN
-        with col_sec2:
-            st.markdown("**B. Kesehatan (Fasilitas)**")
-            def cek_kesehatan(nama):
-                n = str(nama).upper()
-                if 'RUMAH SAKIT' in n or 'RSUD' in n: return 'RUMAH SAKIT'
-                if 'PUSKESMAS' in n: return 'PUSKESMAS'
-                if 'FARMASI' in n and 'INSTALASI' in n: return 'INSTALASI FARMASI'
-                return None
-
-            df_kes = df.copy()
-            df_kes['KATEGORI'] = df_kes['NAMA UNOR'].apply(cek_kesehatan)
-            df_kes = df_kes.dropna(subset=['KATEGORI'])
-            
-            if not df_kes.empty:
-                stats_kes = df_kes.groupby('KATEGORI').size().reset_index(name='Jumlah Unit')
-                fig_kes = px.bar(
-                    stats_kes, x='KATEGORI', y='Jumlah Unit', text='Jumlah Unit',
-                    color='KATEGORI', title="Fasilitas Kesehatan"
-                )
-                fig_kes.update_traces(textposition='outside')
-
-                event_kes = st.plotly_chart(fig_kes, use_container_width=True, on_select="rerun")
-                selected_kes = None
-                if event_kes and len(event_kes['selection']['points']) > 0:
-                    selected_kes = event_kes['selection']['points'][0]['x']
-                
-                if selected_kes:
-                    st.info(f"📂 Detail Data: **{selected_kes}**")
-                    detail_kes = df_kes[df_kes['KATEGORI'] == selected_kes].copy()
-                    tampilkan_dan_download(detail_kes, f"Detail_{selected_kes}")
-            else:
-                st.info("Tidak ditemukan data kesehatan.")
-
-    # === TAB 2: SKPD ===
-    with tab2:
-        if 'Level 2' in df.columns:
-            sorted_skpd = sorted(valid_skpd)
-            col_filter, col_view = st.columns([1, 3])
-            with col_filter:
-                pilihdinas = st.selectbox("Pilih Unit Organisasi (Level 2)", sorted_skpd)
-            
-            with col_view:
-                if pilihdinas:
-                    filtered_df = df[df['Level 2'] == pilihdinas].copy()
-                    
-                    m1, m2 = st.columns(2)
-                    m1.metric(f"Kebutuhan {pilihdinas}", f"{int(filtered_df['TOTAL KEBUTUHAN'].sum())}")
-                    if 'Level 3' in filtered_df.columns:
-                        m2.metric("Jumlah Bidang/Bagian", f"{filtered_df['Level 3'].nunique()}")
-
-                    agg_cols = [c for c in ['Level 3', 'Level 4', 'Level 5', 'Level 6'] if c in filtered_df.columns]
-                    if agg_cols:
-                        st.markdown("##### 📋 Rekapitulasi Struktur")
-                        view_df = filtered_df.groupby(agg_cols)['TOTAL KEBUTUHAN'].sum().reset_index()
-                        tampilkan_dan_download(view_df, f"Rekap_{pilihdinas}")
-                        
-                        if 'Level 3' in filtered_df.columns:
-                            st.divider()
-                            st.markdown("##### 📂 Detail per Bidang")
-                            unique_bidang = sorted([x for x in filtered_df['Level 3'].unique() if str(x) != '-' and str(x) != 'nan'])
-                            pilihbidang = st.selectbox("Filter Bidang (Level 3)", unique_bidang, index=None)
-                            
-                            if pilihbidang:
-                                bidang_view = view_df[view_df['Level 3'] == pilihbidang]
-                                tot_bid = bidang_view['TOTAL KEBUTUHAN'].sum()
-                                st.metric(f"Total Kebutuhan: {pilihbidang}", int(tot_bid))
-                                tampilkan_dan_download(bidang_view, f"Detail_{pilihbidang}")
-
-    # === TAB 3: DATA MASTER ===
-    with tab3:
-        st.markdown("### 📂 Data Master Keseluruhan")
-        filter_nama = st.text_input("Cari nama unit kerja:", key="filter_master")
-        df_display = df.copy()
-        if filter_nama:
-            df_display = df_display[df_display['NAMA UNOR'].str.contains(filter_nama, case=False, na=False)]
-        st.caption(f"Menampilkan {len(df_display)} baris data.")
-        tampilkan_dan_download(df_display, "Master_Data_SOTK")
-
-    # === TAB 4: CARI ID ===
-    with tab4:
-        cari_id = st.text_input("Masukkan ID Unor:")
-        if cari_id:
-            res = df[df['ID'] == cari_id]
-            if not res.empty:
-                st.success("ID Ditemukan")
-                tampilkan_dan_download(res, f"Search_ID_{cari_id}")
-            else:
-                st.warning("ID Tidak Ditemukan")
-
-    # === TAB 5: CARI NAMA ===
-    with tab5:
-        cari_nama_tab = st.text_input("Cari Nama Jabatan / Unit:")
-        if cari_nama_tab:
-            res = df[df['NAMA UNOR'].str.contains(cari_nama_tab, case=False, na=False)]
-            if not res.empty:
-                st.info(f"Ditemukan {len(res)} data")
-                total_keb_cari = res['TOTAL KEBUTUHAN'].sum()
-                st.metric("Total Kebutuhan (Hasil Pencarian)", int(total_keb_cari))
-                
-                cols_show = ['NAMA UNOR'] + [c for c in df.columns if c.startswith('Level ')] + ['TOTAL KEBUTUHAN']
-                cols_show = [c for c in cols_show if c in res.columns]
-                tampilkan_dan_download(res[cols_show], f"Search_Nama_{cari_nama_tab}")
-            else:
-                st.warning("Tidak ditemukan")
-
-    # === TAB 6: VALIDASI ===
-    with tab6:
-        st.markdown("### 🔄 Validasi Data Listing")
-        file_list = st.file_uploader("Upload File Listing", type=['xlsx', 'xls', 'csv'], key='list_up')
-        
-        if file_list and 'Level 2' in df.columns:
-            try:
-                try: df_list = pd.read_excel(file_list)
-                except: file_list.seek(0); df_list = pd.read_csv(file_list)
-
-                df_list.columns = [str(c).strip().upper() for c in df_list.columns]
-                if 'ID' in df_list.columns: df_list['ID'] = df_list['ID'].astype(str).str.strip()
-                
-                cols_to_merge = ['ID', 'Level 2', 'Level 3']
-                cols_to_merge = [c for c in cols_to_merge if c in df.columns]
-                
-                df_merge = pd.merge(df_list, df[cols_to_merge], on='ID', how='left')
-                grp = df_merge.groupby('Level 2').size().reset_index(name='Jumlah')
-                
-                st.markdown("#### 📊 Rekapitulasi Validasi")
-                if not grp.empty:
-                    grp_sorted = grp.sort_values(by='Jumlah', ascending=True)
-                    fig_val = px.bar(
-                        grp_sorted, x='Jumlah', y='Level 2', orientation='h', 
-                        title="Distribusi Listing per SKPD", text='Jumlah', height=600
-                    )
-                    fig_val.update_traces(textposition='outside')
-                    fig_val.update_layout(margin=dict(r=50))
-                    
-                    st.plotly_chart(fig_val, use_container_width=True)
-
-                tampilkan_dan_download(grp, "Rekap_Validasi_Listing")
-                st.divider()
-
-                st.markdown("#### 📂 Detail Data Listing")
-                list_dinas = sorted([x for x in df_merge['Level 2'].unique() if pd.notna(x) and str(x) != '-' and str(x) != 'nan'])
-                pilih_dinas_val = st.selectbox("Pilih Unit Organisasi (Listing):", list_dinas, index=None)
-                
-                if pilih_dinas_val:
-                    detail_val = df_merge[df_merge['Level 2'] == pilih_dinas_val].copy()
-                    tampilkan_dan_download(detail_val, f"Listing_{pilih_dinas_val}")
-                    
-                    if 'Level 3' in detail_val.columns:
-                        list_bidang = sorted([x for x in detail_val['Level 3'].unique() if pd.notna(x) and str(x) != '-' and str(x) != 'nan'])
-                        if list_bidang:
-                            pilih_bidang_val = st.selectbox("Pilih Bidang (Listing):", list_bidang, index=None)
-                            if pilih_bidang_val:
-                                detail_bidang_val = detail_val[detail_val['Level 3'] == pilih_bidang_val]
-                                tampilkan_dan_download(detail_bidang_val, f"Listing_{pilih_bidang_val}")
-
-            except Exception as e:
-                st.error(f"Terjadi kesalahan pada file listing: {e}")
+        "✅ Validasi",
+        "📅 Arsip Periode"
+    ], key="tab_aktif", on_change="rerun")
+
+    if t_vis.open:
+        with t_vis, METRICS.stage('tab.visualisasi'):
+            tab_visualisasi(file_key, df, cube, sotk_index, valid_skpd)
+    elif t_skpd.open:
+        with t_skpd, METRICS.stage('tab.struktur_skpd'):
+            tab_struktur_skpd(df, cube, sotk_index, valid_skpd)
+    elif t_master.open:
+        with t_master, METRICS.stage('tab.data_master'):
+            tab_data_master(df, name_index)
+    elif t_id.open:
+        with t_id, METRICS.stage('tab.cari_id'):
+            tab_cari_id(df, sotk_index)
+    elif t_nama.open:
+        with t_nama, METRICS.stage('tab.cari_nama'):
+            tab_cari_nama(df, name_index)
+    elif t_val.open:
+        with t_val, METRICS.stage('tab.validasi'):
+            tab_validasi(file_key, df, sotk_index, orphans, laporan_hierarki, tabel, file_list)
+    elif t_arsip.open:
+        with t_arsip, METRICS.stage('tab.arsip'):
+            tab_arsip(file_key, file_sotk.name, df)
 
 else:
+    get_jobs().release(sesi_id)
     st.info("👋 Silakan upload file SOTK (.xlsx / .csv) di panel sebelah kiri untuk memulai.")
+
+rerun = METRICS.end_run()
+if debug_mode and rerun is not None:
+    tampilkan_panel_debug(rerun)
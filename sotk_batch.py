@@ -0,0 +1,109 @@
+# Mode batch: olah banyak file SOTK sekaligus tanpa dashboard (tanpa Streamlit/Plotly).
+#
+#   python sotk_batch.py folder_input -o folder_output [-j 4] [--tanpa-excel]
+#
+# Tiap file menghasilkan satu folder berisi data olahan (Parquet), rollup per level,
+# laporan integritas, dan (opsional) rekap Excel. Ringkasan semua file: ringkasan.csv.
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import pandas as pd
+
+from sotk_core import (
+    INTEGRITAS_TABLES, LAPORAN_FILE, LARGE_EXCEL_ENGINE, RollupCube, arrow_safe, build_export_bytes,
+    process_sotk_data, read_sotk_file, sanitize_filename, write_laporan_konsolidasi,
+)
+
+SOTK_EXTENSIONS = ('.xlsx', '.xls', '.csv')
+
+def write_bytes(path, data):
+    with open(path, 'wb') as f:
+        f.write(data)
+
+def process_file(path, out_dir, excel=True):
+    started = time.time()
+    name = os.path.basename(path)
+    ringkasan = {'nama_file': name, 'status': 'OK'}
+    try:
+        with open(path, 'rb') as f:
+            raw_df = read_sotk_file(f.read(), name)
+        df, orphans, laporan, tabel = process_sotk_data(raw_df)
+        if df is None:
+            raise ValueError(orphans)
+
+        target = os.path.join(out_dir, sanitize_filename(name).replace('.', '_'))
+        os.makedirs(target, exist_ok=True)
+        df = arrow_safe(df.reset_index(drop=True))
+        df.to_parquet(os.path.join(target, 'data.parquet'), index=False)
+        arrow_safe(orphans.reset_index(drop=True)).to_parquet(os.path.join(target, 'integritas_yatim.parquet'), index=False)
+        for key in INTEGRITAS_TABLES:
+            tabel[key].to_parquet(os.path.join(target, f'integritas_{key}.parquet'), index=False)
+        with open(os.path.join(target, 'laporan.json'), 'w', encoding='utf-8') as f:
+            json.dump(laporan, f)
+
+        cube = RollupCube(df)
+        for k, table in cube.levels.items():
+            table.to_parquet(os.path.join(target, f'rollup_level{k}.parquet'), index=False)
+        if 2 in cube.levels:
+            # SKPD sama dengan hitungan "Jumlah SKPD" di dashboard (tanpa '-', Bupati / Wakil)
+            rekap = cube.skpd_totals()
+            rekap = rekap[rekap['Level 2'].isin(cube.valid_skpd())].reset_index(drop=True)
+        else:
+            rekap = pd.DataFrame(columns=['Level 2'] + RollupCube.VALUE_COLS)
+        rekap.to_parquet(os.path.join(target, 'rekap_skpd.parquet'), index=False)
+
+        if excel:
+            write_bytes(os.path.join(target, 'rekap_skpd.xlsx'), build_export_bytes(rekap, 'xlsx'))
+            write_bytes(os.path.join(target, 'data_sotk.xlsx'), build_export_bytes(df, 'xlsx'))
+            if LARGE_EXCEL_ENGINE == 'xlsxwriter':
+                write_laporan_konsolidasi(os.path.join(target, LAPORAN_FILE), df, orphans, tabel, cube)
+
+        ringkasan.update({
+            'baris': len(df),
+            'total_kebutuhan': float(cube.total_kebutuhan),
+            'jumlah_skpd': len(rekap),
+            'yatim': len(orphans),
+            'siklus': int(tabel['siklus']['SIKLUS'].nunique()),
+            'id_ganda': len(tabel['duplikat']),
+            'folder': target,
+        })
+    except Exception as e:
+        ringkasan['status'] = f'GAGAL: {e}'
+    ringkasan['detik'] = round(time.time() - started, 2)
+    return ringkasan
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Olah banyak file SOTK sekaligus (tanpa dashboard).')
+    parser.add_argument('input', help='Folder berisi file SOTK (.xlsx / .xls / .csv)')
+    parser.add_argument('-o', '--output', default='hasil_sotk', help='Folder keluaran (default: hasil_sotk)')
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count(), help='Jumlah proses paralel')
+    parser.add_argument('--tanpa-excel', action='store_true', help='Lewati pembuatan file Excel')
+    args = parser.parse_args(argv)
+
+    files = sorted(
+        os.path.join(args.input, f) for f in os.listdir(args.input)
+        if f.lower().endswith(SOTK_EXTENSIONS) and not f.startswith('~$')
+    )
+    if not files:
+        print(f"Tidak ada file SOTK di {args.input}")
+        return 1
+
+    os.makedirs(args.output, exist_ok=True)
+    hasil = []
+    with ProcessPoolExecutor(max_workers=max(1, min(args.jobs, len(files)))) as pool:
+        futures = [pool.submit(process_file, path, args.output, not args.tanpa_excel) for path in files]
+        for future in as_completed(futures):
+            r = future.result()
+            hasil.append(r)
+            print(f"[{r['status']}] {r['nama_file']} ({r['detik']} detik)")
+
+    ringkasan = pd.DataFrame(hasil).sort_values('nama_file')
+    ringkasan.to_csv(os.path.join(args.output, 'ringkasan.csv'), index=False)
+    return 0 if (ringkasan['status'] == 'OK').all() else 1
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,1486 @@
+# Inti pengolahan SOTK tanpa Streamlit/Plotly: dipakai dashboard (data_sotk_hsu.py)
+# dan mode batch (sotk_batch.py).
+import pandas as pd
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+import io
+import os
+import re
+import json
+import uuid
+import shutil
+import time
+import hashlib
+import datetime
+import itertools
+import threading
+from collections import OrderedDict
+
+from sotk_metrics import METRICS
+
+# --- 1. EKSPOR ---
+def sanitize_filename(name):
+    return re.sub(r'[\\/*?:"<>|]', "_", str(name)).strip()
+
+# Ekspor dibuat hanya saat tombol diklik, lalu disimpan per sidik isi tabel
+EXPORT_CACHE_ENTRIES = 32
+EXPORT_CACHE_MAX_BYTES = 256 * 1024 * 1024
+EXPORT_LARGE_ROWS = 50_000  # di atas ini: xlsxwriter constant_memory + opsi CSV
+XLSX_MIME = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+try:
+    import xlsxwriter
+    LARGE_EXCEL_ENGINE = 'xlsxwriter'
+except ImportError:
+    LARGE_EXCEL_ENGINE = 'openpyxl'
+
+# Mode tulis bertahap xlsxwriter: hanya satu baris per sheet yang ditahan di memori.
+# Teks ditulis apa adanya (nama unit berawalan '=' / 'http' bukan rumus / tautan).
+EXCEL_STREAM_OPTIONS = {'constant_memory': True, 'strings_to_formulas': False, 'strings_to_urls': False}
+EXCEL_MAX_ROWS = 1_048_575  # baris data per sheet (di luar header)
+EXCEL_CHUNK_ROWS = 10_000
+
+class ExportCache:
+    def __init__(self, max_entries, max_bytes):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_or_build(self, key, build):
+        with self._lock:
+            if key in self._items:
+                self._items.move_to_end(key)
+                METRICS.incr('ekspor.hit')
+                return self._items[key]
+        METRICS.incr('ekspor.miss')
+        with METRICS.stage('ekspor.build'):
+            data = build()
+        with self._lock:
+            self._items[key] = data
+            while len(self._items) > self.max_entries or (
+                len(self._items) > 1 and sum(len(v) for v in self._items.values()) > self.max_bytes
+            ):
+                self._items.popitem(last=False)
+        return data
+
+def table_fingerprint(df):
+    with METRICS.stage('hash.tabel'):
+        h = hashlib.sha256(repr(list(df.columns)).encode('utf-8'))
+        h.update(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes())
+    return h.hexdigest()
+
+def _excel_values(series):
+    # Nilai Python biasa per sel; NaN/NA -> None (sel kosong)
+    return series.astype(object).where(series.notna(), None).tolist()
+
+def _cell_writer(worksheet, dtype):
+    if isinstance(dtype, pd.CategoricalDtype):
+        dtype = dtype.categories.dtype
+    if pd.api.types.is_bool_dtype(dtype):
+        return worksheet.write_boolean
+    if pd.api.types.is_numeric_dtype(dtype):
+        return worksheet.write_number
+    if pd.api.types.is_string_dtype(dtype) and dtype != object:
+        return worksheet.write_string
+    return worksheet.write  # object: tipe campuran, biar xlsxwriter yang memilih
+
+def write_sheet(workbook, sheet_name, df, header_format=None):
+    # Baris ditulis berurutan dari atas, syarat mode constant_memory (pandas.to_excel
+    # menulis per kolom sehingga isi kolom selain yang terakhir hilang di mode ini)
+    worksheet = workbook.add_worksheet(sheet_name)
+    worksheet.write_row(0, 0, [str(c) for c in df.columns], header_format)
+    rows = min(len(df), EXCEL_MAX_ROWS)
+    widths = [len(str(c)) for c in df.columns]
+    # Metode tulis per tipe kolom: lebih cepat dari worksheet.write yang memeriksa tiap nilai
+    writers = [_cell_writer(worksheet, df[c].dtype) for c in df.columns]
+    for start in range(0, rows, EXCEL_CHUNK_ROWS):
+        part = df.iloc[start:min(start + EXCEL_CHUNK_ROWS, rows)]
+        columns = [_excel_values(part[c]) for c in part.columns]
+        if start == 0:
+            widths = [max([w] + [len(str(v)) for v in values if v is not None]) for w, values in zip(widths, columns)]
+        for row, values in enumerate(zip(*columns), start=start + 1):
+            for col, (value, write) in enumerate(zip(values, writers)):
+                if value is not None:
+                    write(row, col, value)
+    for col, width in enumerate(widths):
+        worksheet.set_column(col, col, min(max(width + 2, 8), 60))
+    worksheet.freeze_panes(1, 0)
+    if widths:
+        worksheet.autofilter(0, 0, rows, len(widths) - 1)
+    return worksheet
+
+def build_export_bytes(df, fmt):
+    if fmt == 'csv':
+        return df.to_csv(index=False).encode('utf-8-sig')
+
+    buffer = io.BytesIO()
+    if len(df) > EXPORT_LARGE_ROWS and LARGE_EXCEL_ENGINE == 'xlsxwriter':
+        with xlsxwriter.Workbook(buffer, EXCEL_STREAM_OPTIONS) as workbook:
+            write_sheet(workbook, 'Data', df, workbook.add_format({'bold': True}))
+        return buffer.getvalue()
+    with pd.ExcelWriter(buffer, engine='openpyxl') as writer:
+        df.to_excel(writer, index=False, sheet_name='Data')
+    return buffer.getvalue()
+
+# --- 2. PROSES DATA ---
+# Batas penelusuran atasan (hop) dan jumlah kolom Level yang ditampilkan
+MAX_HOPS = 10
+MAX_LEVELS = 6
+
+# Kolom ekspor SOTK yang tidak pernah dipakai dashboard
+UNUSED_COLS = ['ROOT ID', 'ROW LEVEL', 'URUTAN', 'AKTIF', 'CORDER', 'INDUK UNOR ID']
+
+def _descendants(parent_codes, seeds, generations):
+    # Tandai seeds dan keturunannya sampai `generations` tingkat (CSR anak per node)
+    n = len(parent_codes)
+    has_parent = np.flatnonzero(parent_codes >= 0)
+    children = has_parent[np.argsort(parent_codes[has_parent], kind='stable')]
+    counts = np.bincount(parent_codes[has_parent], minlength=n)
+    offsets = np.concatenate(([0], np.cumsum(counts)))
+
+    marked = np.zeros(n, dtype=bool)
+    marked[seeds] = True
+    frontier = np.flatnonzero(marked)
+    for _ in range(generations):
+        sizes = counts[frontier]
+        total = int(sizes.sum())
+        if total == 0:
+            break
+        starts = np.repeat(offsets[frontier] - (np.cumsum(sizes) - sizes), sizes)
+        kids = children[starts + np.arange(total)]
+        frontier = kids[~marked[kids]]
+        marked[frontier] = True
+    return marked
+
+def resolve_hierarchy(ids, parents, max_hops=MAX_HOPS, max_levels=MAX_LEVELS, changed=None, removed=()):
+    """Resolusi hierarki tervektorisasi di atas ID yang sudah dikodekan ke integer.
+
+    `ids` dan `parents` adalah Series string sejajar per baris (parent NaN = akar).
+    Untuk ID ganda, atasan yang dipakai adalah kemunculan terakhir (sama seperti
+    `to_dict`). Mengembalikan dict berisi:
+      - codes   : array (baris x kolom Level) kode node, -1 jika kosong
+      - uniques : Index ID unik (kode -> ID)
+      - length  : panjang lineage per baris (maks `max_hops`)
+      - depth   : jumlah hop ke akar per baris, -1 jika masuk siklus
+      - cyclic  : True jika rantai atasan baris tersebut tidak pernah berakhir
+      - source  : posisi baris kemunculan terakhir tiap ID unik
+      - rows    : posisi baris yang baris `codes`-nya dihitung (None = semua)
+      - row_codes, node_parent, node_depth, node_top : kode node per baris, lalu
+        atasan, kedalaman (-1 = siklus) dan akar per node unik (untuk analisis integritas)
+
+    Jika `changed` (posisi baris yang baru/pindah/ganti nama) diberikan dan tidak
+    ada ID ganda, tabel leluhur hanya dihitung untuk baris tersebut, baris yang
+    atasannya ada di `removed`, beserta keturunannya dalam jangkauan `max_hops`;
+    baris lain tidak berubah lineage-nya.
+    """
+    row_codes, uniques = pd.factorize(ids)
+    row_codes = row_codes.astype(np.int64)
+    uniques = pd.Index(uniques)
+    n = len(uniques)
+
+    # Atasan per node unik (kemunculan terakhir), -1 = berhenti
+    last_pos = np.full(n, -1, dtype=np.int64)
+    last_pos[row_codes] = np.arange(len(row_codes))
+    parent_ids = pd.Series(parents).to_numpy(dtype=object)[last_pos] if n else np.array([], dtype=object)
+    parent_codes = uniques.get_indexer(pd.Index(parent_ids, dtype=object)).astype(np.int64)
+    parent_codes[parent_codes == np.arange(n)] = -1
+
+    # Pointer jumping: jarak ke akar dan deteksi siklus dalam O(n log n)
+    # `top` ikut melompat: akar tiap node, atau node di dalam siklus untuk rantai melingkar
+    nxt = parent_codes.copy()
+    dist = (parent_codes >= 0).astype(np.int64)
+    top = np.where(parent_codes >= 0, parent_codes, np.arange(n))
+    for _ in range(int(np.ceil(np.log2(n + 1))) + 1):
+        active = np.flatnonzero(nxt >= 0)
+        if active.size == 0:
+            break
+        target = nxt[active]
+        dist[active] = dist[active] + dist[target]
+        nxt[active] = nxt[target]
+        top = top[top]
+    node_cyclic = nxt >= 0
+    node_depth = np.where(node_cyclic, -1, dist)
+
+    # Tabel leluhur level demi level; indeks n adalah sentinel "kosong"
+    parent_ext = np.append(np.where(parent_codes >= 0, parent_codes, n), n)
+    node_len = np.where(node_cyclic, max_hops, np.minimum(node_depth + 1, max_hops))
+    length = node_len[row_codes] if n else np.zeros(0, dtype=np.int64)
+    n_cols = int(min(max_levels, length.max())) if length.size else 0
+
+    rows = None
+    if changed is not None and n == len(row_codes):
+        # Node yang atasannya baru saja dihapus (`removed`) ikut dihitung ulang
+        missing = np.flatnonzero((parent_codes < 0) & pd.notna(parent_ids))
+        missing = missing[pd.Index(removed, dtype=object).get_indexer(parent_ids[missing]) >= 0]
+        affected = _descendants(parent_codes, np.union1d(row_codes[changed], missing), max_hops - 1)
+        rows = np.flatnonzero(affected[row_codes])
+
+    target = slice(None) if rows is None else rows
+    ancestors = np.empty((len(row_codes[target]), max(n_cols, 1)), dtype=np.int64)
+    hop_needed = length[target][:, None] - 1 - np.arange(n_cols)[None, :]
+    current = row_codes[target].copy()
+    for hop in range(int(hop_needed.max()) + 1 if hop_needed.size else 0):
+        match = hop_needed == hop
+        if match.any():
+            ancestors[match] = np.broadcast_to(current[:, None], match.shape)[match]
+        current = parent_ext[current]
+    codes = np.where(hop_needed >= 0, ancestors[:, :n_cols], -1)
+
+    return {
+        'codes': codes,
+        'uniques': uniques,
+        'length': length,
+        'depth': node_depth[row_codes] if n else length,
+        'cyclic': node_cyclic[row_codes] if n else np.zeros(0, dtype=bool),
+        'source': last_pos,
+        'rows': rows,
+        'row_codes': row_codes,
+        'node_parent': parent_codes,
+        'node_depth': node_depth,
+        'node_top': top,
+    }
+
+# URUTAN TAMPILAN YANG DIINGINKAN (TOP to BOTTOM)
+JABATAN_ORDER = [
+    'JABATAN PIMPINAN TINGGI PRATAMA (Eselon II)',
+    'JABATAN ADMINISTRATOR (Eselon III)',
+    'JABATAN PENGAWAS (Eselon IV)',
+    'JABATAN FUNGSIONAL',
+    'JABATAN PELAKSANA'
+]
+
+# Aturan klasifikasi dievaluasi berurutan; aturan pertama yang cocok menang.
+# Tiap syarat: (kolom, 'contains' | 'in', nilai); satu syarat terpenuhi sudah cukup.
+JABATAN_RULES = [
+    ('JABATAN PIMPINAN TINGGI PRATAMA (Eselon II)', [
+        ('ESELON', 'contains', 'II'), ('ESELON', 'in', ['21', '22']), ('JENJANG JABATAN', 'contains', 'PIMPINAN TINGGI')]),
+    ('JABATAN ADMINISTRATOR (Eselon III)', [
+        ('ESELON', 'contains', 'III'), ('ESELON', 'in', ['31', '32']), ('JENJANG JABATAN', 'contains', 'ADMINISTRATOR')]),
+    ('JABATAN PENGAWAS (Eselon IV)', [
+        ('ESELON', 'contains', 'IV'), ('ESELON', 'in', ['41', '42']), ('JENJANG JABATAN', 'contains', 'PENGAWAS')]),
+    ('JABATAN PELAKSANA', [
+        ('JENIS JABATAN', 'contains', 'PELAKSANA'), ('JENJANG JABATAN', 'contains', 'PELAKSANA'),
+        ('JENIS JABATAN', 'contains', 'FUNGSIONAL UMUM')]),
+    ('JABATAN FUNGSIONAL', [
+        ('JENIS JABATAN', 'contains', 'FUNGSIONAL'), ('JENJANG JABATAN', 'contains', 'FUNGSIONAL')]),
+]
+
+def _normalized_codes(series):
+    # Normalisasi (strip + upper) hanya pada nilai unik; baris merujuk lewat kode
+    codes, uniques = pd.factorize(series)
+    values = np.array(['' if pd.isna(v) else str(v).strip().upper() for v in np.asarray(uniques, dtype=object)] + [''], dtype=object)
+    return codes, values
+
+def classify_jabatan(df):
+    columns = {}
+    for col in {c for _, conds in JABATAN_RULES for c, _, _ in conds}:
+        if col in df.columns:
+            columns[col] = _normalized_codes(df[col])
+        else:
+            columns[col] = (np.full(len(df), -1), np.array([''], dtype=object))
+
+    conditions = []
+    for _, conds in JABATAN_RULES:
+        match = np.zeros(len(df), dtype=bool)
+        for col, op, value in conds:
+            codes, values = columns[col]
+            if op == 'contains':
+                hit = np.array([value in v for v in values], dtype=bool)
+            else:
+                hit = np.isin(values, value)
+            match |= hit[codes]
+        conditions.append(match)
+
+    labels = np.select(conditions, [label for label, _ in JABATAN_RULES], default=None)
+    return pd.Categorical(labels, categories=JABATAN_ORDER, ordered=True)
+
+# Aturan sektor per grup; tiap grup menjadi satu kolom category 'SEKTOR <GRUP>'.
+# Kategori dicek berurutan (yang pertama cocok menang). Tiap kategori berisi
+# alternatif berupa tuple kata kunci yang SEMUANYA harus ada di NAMA UNOR (huruf besar).
+SEKTOR_RULES = {
+    'PENDIDIKAN': [
+        ('TK', [('TK ',), ('TAMAN KANAK',)]),
+        ('SD', [('SD ',), ('SEKOLAH DASAR',)]),
+        ('SMP', [('SMP ',), ('SEKOLAH MENENGAH',)]),
+    ],
+    'KESEHATAN': [
+        ('RUMAH SAKIT', [('RUMAH SAKIT',), ('RSUD',)]),
+        ('PUSKESMAS', [('PUSKESMAS',)]),
+        ('INSTALASI FARMASI', [('FARMASI', 'INSTALASI')]),
+    ],
+}
+
+def _sector_pattern(rules):
+    # Satu regex per grup: alternatif di posisi '^' dicoba sesuai urutan aturan,
+    # nama grup regex yang cocok (k0, k1, ...) menunjuk kategori pemenang.
+    parts = []
+    for i, (_, alternatives) in enumerate(rules):
+        alt = '|'.join(''.join(f'(?=.*{re.escape(k)})' for k in keywords) for keywords in alternatives)
+        parts.append(f'(?:{alt})(?P<k{i}>)')
+    return re.compile('^(?:' + '|'.join(parts) + ')', re.DOTALL)
+
+def tag_sectors(names):
+    codes, uniques = pd.factorize(names)
+    upper = [str(v).upper() for v in np.asarray(uniques, dtype=object)]
+
+    result = {}
+    for grup, rules in SEKTOR_RULES.items():
+        pattern = _sector_pattern(rules)
+        matched = (pattern.match(n) for n in upper)
+        cat_codes = np.fromiter((int(m.lastgroup[1:]) if m else -1 for m in matched), dtype=np.int64, count=len(upper))
+        cat_codes = np.append(cat_codes, -1)  # kode -1 (NaN) -> tanpa kategori
+        result[f'SEKTOR {grup}'] = pd.Categorical.from_codes(cat_codes[codes], categories=[label for label, _ in rules])
+    return result
+
+def compact_frame(df):
+    # Representasi hemat memori: kolom Level/atasan berulang -> category,
+    # ID & nama unik -> string Arrow (bukan objek Python per sel)
+    for col in df.columns:
+        if col.startswith('Level ') or col == 'NAMA ATASAN':
+            df[col] = df[col].astype('category')
+        elif col in ('ID', 'NAMA UNOR'):
+            df[col] = df[col].astype('string[pyarrow]')
+    return df
+
+# --- PERUBAHAN ANTAR VERSI ---
+# Kerangka = kolom minimum untuk membandingkan dua versi SOTK per ID.
+PERUBAHAN_ORDER = ['BARU', 'DIHAPUS', 'PINDAH', 'GANTI NAMA', 'KEBUTUHAN']
+
+def _diff_rows(old, new, pos):
+    # Posisi baris (lama, baru) per jenis perubahan; `pos` = posisi lama tiap baris baru
+    matched = np.flatnonzero(pos >= 0)
+    removed = np.ones(len(old), dtype=bool)
+    removed[pos[matched]] = False
+    changes = {'BARU': (None, np.flatnonzero(pos < 0)), 'DIHAPUS': (np.flatnonzero(removed), None)}
+    for jenis, col in (('PINDAH', 'DIATASAN ID'), ('GANTI NAMA', 'NAMA UNOR'), ('KEBUTUHAN', 'TOTAL KEBUTUHAN')):
+        empty = 0 if col == 'TOTAL KEBUTUHAN' else ''
+        lama = old[col].take(pos[matched]).fillna(empty).to_numpy()
+        baru = new[col].take(matched).fillna(empty).to_numpy()
+        rows = matched[lama != baru]
+        changes[jenis] = (pos[rows], rows)
+    return changes
+
+def diff_sotk(old, new, changes=None):
+    """Laporan perubahan per ID antara dua kerangka (kemunculan terakhir tiap ID).
+
+    Satu ID bisa muncul di beberapa baris laporan (mis. pindah sekaligus ganti nama).
+    """
+    if changes is None:
+        old = old.drop_duplicates('ID', keep='last').reset_index(drop=True)
+        new = new.drop_duplicates('ID', keep='last').reset_index(drop=True)
+        changes = _diff_rows(old, new, pd.Index(old['ID']).get_indexer(new['ID']))
+
+    parts = []
+    for jenis, (old_rows, new_rows) in changes.items():
+        frame, rows = (new, new_rows) if new_rows is not None else (old, old_rows)
+        part = {'ID': frame['ID'].take(rows).reset_index(drop=True), 'PERUBAHAN': jenis}
+        for col in ('NAMA UNOR', 'DIATASAN ID', 'TOTAL KEBUTUHAN'):
+            for suffix, src, src_rows in ((' LAMA', old, old_rows), (' BARU', new, new_rows)):
+                if src_rows is None:
+                    part[col + suffix] = 0.0 if col == 'TOTAL KEBUTUHAN' else None
+                else:
+                    part[col + suffix] = src[col].take(src_rows).reset_index(drop=True)
+        parts.append(pd.DataFrame(part, index=pd.RangeIndex(len(rows))))
+
+    laporan = pd.concat(parts, ignore_index=True)
+    laporan['PERUBAHAN'] = pd.Categorical(laporan['PERUBAHAN'], categories=PERUBAHAN_ORDER, ordered=True)
+    laporan['SELISIH KEBUTUHAN'] = laporan['TOTAL KEBUTUHAN BARU'] - laporan['TOTAL KEBUTUHAN LAMA']
+    return laporan[[
+        'ID', 'PERUBAHAN', 'NAMA UNOR LAMA', 'NAMA UNOR BARU', 'DIATASAN ID LAMA', 'DIATASAN ID BARU',
+        'TOTAL KEBUTUHAN LAMA', 'TOTAL KEBUTUHAN BARU', 'SELISIH KEBUTUHAN'
+    ]]
+
+def _splice_category(prev, prev_pos, rows, fresh):
+    # Kolom category: nilai lama per `prev_pos` (-1 / kolom tidak ada -> '-'),
+    # lalu baris `rows` ditimpa `fresh`. Kategori terurut seperti astype('category').
+    fresh_codes, fresh_uniques = pd.factorize(fresh)
+    old_categories = prev.cat.categories if prev is not None else pd.Index([], dtype=object)
+    categories = old_categories.union(pd.Index(fresh_uniques)).union(pd.Index(['-']))
+    old_map = np.append(categories.get_indexer(old_categories), categories.get_loc('-'))
+    if prev is not None:
+        old_codes = np.append(prev.cat.codes.to_numpy(), -1)[prev_pos]
+    else:
+        # Kolom Level baru (versi baru lebih dalam): baris tak terdampak tidak mencapai level ini
+        old_codes = np.full(len(prev_pos), -1)
+    codes = old_map[old_codes]
+    codes[rows] = categories.get_indexer(fresh_uniques)[fresh_codes]
+    return pd.Categorical.from_codes(codes, categories=categories).remove_unused_categories()
+
+# --- INTEGRITAS STRUKTUR ---
+INTEGRITAS_TABLES = ['siklus', 'duplikat', 'kedalaman', 'akar']
+
+def analyze_integrity(df, parents, hier, max_hops=MAX_HOPS, max_levels=MAX_LEVELS):
+    """Laporan integritas dari hasil `resolve_hierarchy`, tanpa menelusuri pohon ulang.
+
+    Mengembalikan dict DataFrame: `siklus` (anggota tiap siklus), `duplikat` (ID
+    ganda), `kedalaman` (baris melebihi Level/hop) dan `akar` (tiap pohon terpisah
+    beserta ukurannya). Unit yatim tetap dilaporkan terpisah oleh `process_sotk_data`.
+    """
+    row_codes, parent, depth, top = hier['row_codes'], hier['node_parent'], hier['node_depth'], hier['node_top']
+    n = len(hier['uniques'])
+
+    def node_values(col, nodes):
+        # Nilai kolom untuk node tertentu saja (baris kemunculan terakhir), tanpa konversi satu kolom penuh
+        return col.take(hier['source'][nodes]).to_numpy(dtype=object)
+
+    # `top` node melingkar pasti berada di dalam siklus: telusuri tiap siklus sekali saja
+    cycle = np.full(n, -1, dtype=np.int64)
+    members, heads = [], []
+    for start in np.unique(top[depth < 0]):
+        if cycle[start] >= 0:
+            continue
+        heads.append(start)
+        node = start
+        while cycle[node] < 0:
+            cycle[node] = len(heads) - 1
+            members.append(node)
+            node = parent[node]
+    members = np.asarray(members, dtype=np.int64)
+    siklus = pd.DataFrame({
+        'SIKLUS': cycle[members] + 1, 'ID': node_values(df['ID'], members),
+        'NAMA UNOR': node_values(df['NAMA UNOR'], members), 'DIATASAN ID': node_values(parents, members),
+    })
+
+    counts = np.bincount(row_codes, minlength=n)
+    dup = np.flatnonzero(counts > 1)
+    duplikat = pd.DataFrame({
+        'ID': node_values(df['ID'], dup), 'JUMLAH BARIS': counts[dup],
+        'NAMA UNOR (DIPAKAI)': node_values(df['NAMA UNOR'], dup),
+    })
+
+    row_depth = hier['depth'] + 1
+    over = np.flatnonzero(row_depth > max_levels)
+    kedalaman = pd.DataFrame({
+        'ID': df['ID'].take(over).to_numpy(dtype=object),
+        'NAMA UNOR': df['NAMA UNOR'].take(over).to_numpy(dtype=object),
+        'KEDALAMAN': row_depth[over],
+        'KETERANGAN': np.where(
+            row_depth[over] > max_hops,
+            f'Lineage terpotong {max_hops} hop (Level 1 bukan akar)', f'Melebihi Level {max_levels}'
+        ),
+    })
+
+    # Komponen per baris: akar pohonnya, atau n + nomor siklus untuk rantai melingkar
+    component = np.where(depth >= 0, top, n + cycle[top])[row_codes]
+    sizes = np.bincount(component, minlength=n + len(heads))
+    max_depth = np.zeros(len(sizes), dtype=np.int64)
+    np.maximum.at(max_depth, component, row_depth)
+    keys = np.flatnonzero(sizes)
+    is_cycle = keys >= n
+    node = keys.copy()
+    node[is_cycle] = np.asarray(heads, dtype=np.int64)[keys[is_cycle] - n]
+    root_ids, root_parents = node_values(df['ID'], node), node_values(parents, node)
+    orphan_root = ~is_cycle & pd.notna(root_parents) & (root_parents != root_ids)
+    depth_max = pd.array(max_depth[keys], dtype='Int64')
+    depth_max[is_cycle] = pd.NA
+    akar = pd.DataFrame({
+        'ID AKAR': root_ids, 'NAMA UNOR': node_values(df['NAMA UNOR'], node),
+        'JENIS': np.select([is_cycle, orphan_root], ['SIKLUS', 'YATIM'], 'AKAR'),
+        'JUMLAH UNIT': sizes[keys],
+        'KEDALAMAN MAKS': depth_max,
+    })
+    akar = akar.sort_values('JUMLAH UNIT', ascending=False, kind='stable').reset_index(drop=True)
+
+    return {'siklus': siklus, 'duplikat': duplikat, 'kedalaman': kedalaman, 'akar': akar}
+
+PEMBANDING_MIN_OVERLAP = 0.5  # porsi ID yang sama agar versi lama dipakai sebagai pembanding
+
+def _id_overlap(old_ids, new_ids):
+    # ID bersama dibanding jumlah ID unik versi terbesar
+    old_ids, new_ids = pd.Index(old_ids).unique(), pd.Index(new_ids).unique()
+    size = max(len(old_ids), len(new_ids))
+    return len(new_ids.intersection(old_ids)) / size if size else 0.0
+
+def process_sotk_data(df, max_hops=MAX_HOPS, max_levels=MAX_LEVELS, previous=None):
+    # `previous` = {'data': hasil olahan versi lama, 'kerangka': kerangka versi lama};
+    # bila ada, hanya baris yang terdampak perubahan yang disusun ulang Level-nya.
+    df.columns = [str(c).strip().upper() for c in df.columns]
+
+    if 'ID' not in df.columns or 'NAMA UNOR' not in df.columns:
+        return None, "Kolom 'ID' dan 'NAMA UNOR' wajib ada.", None, None
+
+    df['ID'] = df['ID'].astype(str).str.strip()
+    df['NAMA UNOR'] = df['NAMA UNOR'].astype(str).str.lstrip('-')
+    
+    if 'TOTAL KEBUTUHAN' in df.columns:
+        df['TOTAL KEBUTUHAN'] = pd.to_numeric(df['TOTAL KEBUTUHAN'], errors='coerce').fillna(0)
+    
+    if 'DIATASAN ID' in df.columns:
+        df['DIATASAN ID'] = df['DIATASAN ID'].astype(str).str.strip().replace(['nan', 'None', '', 'NaN'], np.nan)
+
+    if 'DIATASAN ID' not in df.columns:
+        parents = pd.Series(np.nan, index=df.index, dtype=object)
+    else:
+        parents = df['DIATASAN ID']
+
+    kerangka = pd.DataFrame({
+        'ID': df['ID'].astype('string[pyarrow]'),
+        'DIATASAN ID': parents.astype('string[pyarrow]'),
+        'NAMA UNOR': df['NAMA UNOR'].astype('string[pyarrow]'),
+        'TOTAL KEBUTUHAN': df['TOTAL KEBUTUHAN'] if 'TOTAL KEBUTUHAN' in df.columns else 0.0,
+    }).reset_index(drop=True)
+
+    if previous is not None and _id_overlap(previous['kerangka']['ID'], kerangka['ID']) < PEMBANDING_MIN_OVERLAP:
+        # Pembanding bukan SOTK yang sama (mis. file lain): olah penuh, tanpa laporan perubahan
+        previous = None
+
+    perubahan = changed = prev_pos = None
+    if previous is not None:
+        old_ids = pd.Index(previous['kerangka']['ID'])
+        if old_ids.is_unique and not kerangka['ID'].duplicated().any():
+            prev_pos = old_ids.get_indexer(kerangka['ID'])
+            changes = _diff_rows(previous['kerangka'], kerangka, prev_pos)
+            perubahan = diff_sotk(previous['kerangka'], kerangka, changes)
+            changed = np.concatenate([changes[j][1] for j in ('BARU', 'PINDAH', 'GANTI NAMA')])
+            renamed = np.concatenate([changes[j][1] for j in ('BARU', 'GANTI NAMA')])
+            removed = previous['kerangka']['ID'].take(changes['DIHAPUS'][0]).to_numpy(dtype=object)
+        else:
+            perubahan = diff_sotk(previous['kerangka'], kerangka)
+
+    hier = resolve_hierarchy(
+        df['ID'], parents, max_hops=max_hops, max_levels=max_levels,
+        changed=changed, removed=removed if changed is not None else ()
+    )
+    parent_codes = hier['uniques'].get_indexer(pd.Index(parents.to_numpy(dtype=object), dtype=object))
+
+    orphans = df[parents.notna().to_numpy() & (parent_codes < 0)].copy()
+
+    # Nama per kode node (kemunculan terakhir, sama seperti name_map lama); indeks -1 -> '-'
+    names = np.append(df['NAMA UNOR'].to_numpy(dtype=object)[hier['source']], '-')
+
+    rows = hier['rows']
+    prev_df = previous['data'] if rows is not None else None
+
+    level_cols = [f'Level {i+1}' for i in range(hier['codes'].shape[1])]
+    for i, col in enumerate(level_cols):
+        if rows is None:
+            df[col] = names[hier['codes'][:, i]]
+            continue
+        # Baris tak terdampak menyalin Level dari versi lama (ID baru selalu terdampak)
+        prev_col = prev_df[col] if col in prev_df.columns else None
+        df[col] = _splice_category(prev_col, prev_pos, rows, names[hier['codes'][:, i]])
+
+    if 'DIATASAN ID' in df.columns:
+        df['NAMA ATASAN'] = names[parent_codes]
+
+    if 'ESELON' in df.columns and 'JENIS JABATAN' in df.columns:
+        df['KELOMPOK_JABATAN'] = classify_jabatan(df)
+
+    if prev_pos is None:
+        for col, values in tag_sectors(df['NAMA UNOR']).items():
+            df[col] = values
+    else:
+        # Tag sektor hanya bergantung pada nama: cukup hitung untuk nama baru / berubah
+        for col, values in tag_sectors(df['NAMA UNOR'].iloc[renamed]).items():
+            prev_codes = previous['data'][col].cat.set_categories(values.categories).cat.codes.to_numpy()
+            codes = np.append(prev_codes, -1)[prev_pos]
+            codes[renamed] = values.codes
+            df[col] = pd.Categorical.from_codes(codes, categories=values.categories)
+
+    laporan = {
+        'max_depth': int(hier['depth'].max()) if len(df) else 0,
+        'cyclic_ids': df.loc[hier['cyclic'], 'ID'].unique().tolist(),
+        'overflow_ids': df.loc[hier['depth'] + 1 > max_levels, 'ID'].unique().tolist(),
+        'baris_dihitung': len(df) if rows is None else len(rows),
+    }
+
+    tabel = {'kerangka': kerangka, 'perubahan': perubahan}
+    tabel.update(analyze_integrity(df, parents, hier, max_hops=max_hops, max_levels=max_levels))
+
+    drop_cols = ['DIATASAN ID'] + UNUSED_COLS
+    df = df.drop(columns=[c for c in drop_cols if c in df.columns])
+
+    return compact_frame(df), orphans, laporan, tabel
+
+# --- 2a. PEMBACAAN FILE ---
+# Semua kolom ini dibaca sebagai teks (mencegah ID '123' menjadi '123.0' bila
+# kolomnya ada yang kosong); kolom referensi jabatan lalu dijadikan category.
+TEXT_COLS = ['ID', 'DIATASAN ID', 'ESELON', 'JENIS JABATAN', 'JENJANG JABATAN']
+CATEGORY_COLS = ['ESELON', 'JENIS JABATAN', 'JENJANG JABATAN']
+CSV_CHUNK_BYTES = 50 * 1024 * 1024
+CSV_CHUNK_ROWS = 200_000
+
+try:
+    import python_calamine
+    EXCEL_ENGINE = 'calamine'
+except ImportError:
+    python_calamine = None
+    EXCEL_ENGINE = None
+
+def _read_plan(header):
+    # Pemetaan nama kolom asli -> kolom yang dibaca & dtype-nya
+    usecols, dtype = [], {}
+    for raw in header:
+        name = str(raw).strip().upper()
+        if name in UNUSED_COLS:
+            continue
+        usecols.append(raw)
+        if name in TEXT_COLS:
+            dtype[raw] = str
+    return usecols, dtype
+
+def _to_category(df):
+    for col in df.columns:
+        if str(col).strip().upper() in CATEGORY_COLS:
+            df[col] = df[col].astype('category')
+    return df
+
+def read_sotk_file(file_bytes, file_name):
+    if file_name.lower().endswith('.csv'):
+        header = pd.read_csv(io.BytesIO(file_bytes), nrows=0).columns
+        usecols, dtype = _read_plan(header)
+        if len(file_bytes) <= CSV_CHUNK_BYTES:
+            return _to_category(pd.read_csv(io.BytesIO(file_bytes), usecols=usecols, dtype=dtype))
+        chunks = pd.read_csv(io.BytesIO(file_bytes), usecols=usecols, dtype=dtype, chunksize=CSV_CHUNK_ROWS)
+        return _to_category(pd.concat((_to_category(c) for c in chunks), ignore_index=True))
+
+    engines = [EXCEL_ENGINE, None] if EXCEL_ENGINE else [None]
+    for i, engine in enumerate(engines):
+        try:
+            header = pd.read_excel(io.BytesIO(file_bytes), nrows=0, engine=engine).columns
+            usecols, dtype = _read_plan(header)
+            return _to_category(pd.read_excel(io.BytesIO(file_bytes), usecols=usecols, dtype=dtype, engine=engine))
+        except Exception:
+            # calamine gagal -> coba ulang dengan engine bawaan pandas (openpyxl)
+            if i == len(engines) - 1:
+                raise
+
+# --- 2b. CACHE DISK (PARQUET) ---
+# Hasil olahan disimpan per hash isi file agar proses baru / upload ulang tidak
+# perlu membaca Excel dan menyusun hierarki lagi.
+CACHE_DIR = os.environ.get('SOTK_CACHE_DIR', '.sotk_cache')
+CACHE_MAX_BYTES = int(os.environ.get('SOTK_CACHE_MAX_MB', '512')) * 1024 * 1024
+CACHE_VERSION = 7  # naikkan jika format keluaran process_sotk_data berubah
+
+def file_fingerprint(data):
+    with METRICS.stage('hash.file'):
+        digest = hashlib.sha256(data).hexdigest()
+    return f"{digest}_v{CACHE_VERSION}_h{MAX_HOPS}_l{MAX_LEVELS}"
+
+def arrow_safe(df):
+    # Kolom object bertipe campuran (mis. angka & teks) tidak bisa ditulis ke Parquet
+    for col in df.columns:
+        if df[col].dtype == object:
+            kind = pd.api.types.infer_dtype(df[col], skipna=True)
+            if kind not in ('string', 'empty', 'integer', 'floating', 'boolean'):
+                df[col] = df[col].where(df[col].isna(), df[col].astype(str))
+    return df
+
+def _cache_size(path):
+    return sum(os.path.getsize(os.path.join(path, f)) for f in os.listdir(path))
+
+def _cache_evict(keep):
+    entries = []
+    for name in os.listdir(CACHE_DIR):
+        path = os.path.join(CACHE_DIR, name)
+        if os.path.isdir(path) and not name.startswith('.tmp') and name != keep:
+            entries.append((os.path.getmtime(path), _cache_size(path), path))
+
+    total = sum(size for _, size, _ in entries) + _cache_size(os.path.join(CACHE_DIR, keep))
+    for _, size, path in sorted(entries):
+        if total <= CACHE_MAX_BYTES:
+            break
+        shutil.rmtree(path, ignore_errors=True)
+        total -= size
+
+def cache_load(key):
+    path = os.path.join(CACHE_DIR, key)
+    try:
+        df = pd.read_parquet(os.path.join(path, 'data.parquet'))
+        orphans = pd.read_parquet(os.path.join(path, 'orphans.parquet'))
+        with open(os.path.join(path, 'laporan.json'), encoding='utf-8') as f:
+            laporan = json.load(f)
+        # Tabel pelengkap: laporan perubahan (bila ada pembanding) dan laporan integritas
+        tabel = {}
+        for name in ['perubahan'] + INTEGRITAS_TABLES:
+            table_path = os.path.join(path, f'{name}.parquet')
+            tabel[name] = pd.read_parquet(table_path) if os.path.exists(table_path) else None
+        os.utime(path)  # tandai baru dipakai (LRU)
+    except (OSError, ValueError):
+        return None
+    return df, orphans, laporan, tabel
+
+def cache_previous(key, file_name=None):
+    # Calon pembanding upload baru: versi terakhir dengan nama file sama, atau bila tidak ada,
+    # versi terakhir mana pun dengan parameter yang sama. Kecocokan isi (ID) dicek oleh
+    # process_sotk_data; calon yang ternyata SOTK lain diabaikan di sana.
+    same_name = (file_name or '').lower()
+    suffix = key.split('_', 1)[1]
+    latest = None
+    try:
+        names = os.listdir(CACHE_DIR)
+    except OSError:
+        return None
+    for name in names:
+        if name == key or name.startswith('.tmp') or not name.endswith('_' + suffix):
+            continue
+        try:
+            with open(os.path.join(CACHE_DIR, name, 'meta.json'), encoding='utf-8') as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            continue
+        rank = (meta['nama_file'].lower() == same_name, meta['dibuat'])
+        if latest is None or rank > latest[0]:
+            latest = (rank, meta, name)
+
+    if latest is None:
+        return None
+    _, meta, name = latest
+    try:
+        return {
+            'data': pd.read_parquet(os.path.join(CACHE_DIR, name, 'data.parquet')),
+            'kerangka': pd.read_parquet(os.path.join(CACHE_DIR, name, 'kerangka.parquet')),
+            'nama_file': meta['nama_file'],
+        }
+    except (OSError, ValueError):
+        return None
+
+def cache_store(key, tables, laporan, file_name):
+    path = os.path.join(CACHE_DIR, key)
+    tmp_path = os.path.join(CACHE_DIR, f".tmp_{key}_{uuid.uuid4().hex}")
+    try:
+        os.makedirs(tmp_path)
+        for name, table in tables.items():
+            if table is not None:
+                table.to_parquet(os.path.join(tmp_path, f'{name}.parquet'), index=False)
+        with open(os.path.join(tmp_path, 'laporan.json'), 'w', encoding='utf-8') as f:
+            json.dump(laporan, f)
+        with open(os.path.join(tmp_path, 'meta.json'), 'w', encoding='utf-8') as f:
+            json.dump({'nama_file': file_name, 'dibuat': time.time()}, f)
+        shutil.rmtree(path, ignore_errors=True)
+        os.replace(tmp_path, path)
+        _cache_evict(key)
+    except Exception:
+        # Cache hanya optimasi; kegagalan tulis tidak boleh menghentikan dashboard
+        shutil.rmtree(tmp_path, ignore_errors=True)
+
+def build_sotk_file(file_key, file_name, file_bytes, progress=None):
+    # Baca -> olah -> simpan ke cache disk (tanpa cek cache). `progress(tahap)` dipanggil
+    # tiap pergantian tahap. Hasil sama seperti load_sotk_file, tabel masih berisi kerangka.
+    progress = progress or (lambda tahap: None)
+    try:
+        progress('baca_file')
+        with METRICS.stage('muat.baca_file'):
+            raw_df = read_sotk_file(file_bytes, file_name)
+    except Exception as e:
+        return None, f"Gagal membaca file: {e}", None, None
+
+    progress('olah')
+    with METRICS.stage('muat.versi_sebelumnya'):
+        previous = cache_previous(file_key, file_name)
+    with METRICS.stage('muat.proses'):
+        df, orphans, laporan, tabel = process_sotk_data(raw_df, previous=previous)
+    if df is None:
+        return df, orphans, laporan, None
+    if tabel['perubahan'] is not None:
+        laporan['pembanding'] = previous['nama_file']
+
+    progress('simpan')
+    with METRICS.stage('muat.simpan_cache'):
+        df = arrow_safe(df.reset_index(drop=True))
+        orphans = arrow_safe(orphans.reset_index(drop=True))
+        cache_store(file_key, {'data': df, 'orphans': orphans, **tabel}, laporan, file_name)
+    return df, orphans, laporan, tabel
+
+def load_sotk_file(file_key, file_name, file_bytes):
+    # Cache disk -> baca -> olah -> simpan. Hasil: (df, orphans, laporan, tabel),
+    # atau (None, pesan_error, None, None) bila file tidak bisa diolah.
+    with METRICS.stage('muat.cache_disk'):
+        cached = cache_load(file_key)
+    if cached is not None:
+        METRICS.incr('muat.cache_disk.hit')
+        return cached
+    METRICS.incr('muat.cache_disk.miss')
+
+    df, orphans, laporan, tabel = build_sotk_file(file_key, file_name, file_bytes)
+    if df is None:
+        return df, orphans, laporan, tabel
+    # Kembalikan versi hasil baca Parquet agar tipe kolom sama persis dengan saat warm start
+    tabel.pop('kerangka')
+    with METRICS.stage('muat.baca_ulang'):
+        reloaded = cache_load(file_key)
+    return reloaded or (df, orphans, laporan, tabel)
+
+def cache_exists(key):
+    return os.path.exists(os.path.join(CACHE_DIR, key, 'meta.json'))
+
+# --- 2c. INDEKS PENCARIAN ---
+class GroupIndex:
+    """Indeks posisi baris per nilai kunci.
+
+    Kunci di-hash ke kode (`keys`), baris diurutkan stabil per kode (`order`), dan
+    baris milik kode k ada di `order[offsets[k]:offsets[k + 1]]` dengan urutan asli.
+    """
+    def __init__(self, values):
+        codes, uniques = pd.factorize(values)
+        self.keys = uniques if isinstance(uniques, pd.Index) else pd.Index(uniques)
+        valid = np.flatnonzero(codes >= 0)
+        self.order = valid[np.argsort(codes[valid], kind='stable')]
+        counts = np.bincount(codes[valid], minlength=len(self.keys))
+        self.offsets = np.concatenate([[0], np.cumsum(counts)])
+
+    def positions(self, key):
+        try:
+            code = self.keys.get_loc(key)
+        except (KeyError, TypeError):
+            return self.order[:0]
+        return self.order[self.offsets[code]:self.offsets[code + 1]]
+
+def build_sotk_index(df):
+    index = {'ID': GroupIndex(df['ID'])}
+    if 'Level 2' in df.columns:
+        index['Level 2'] = GroupIndex(df['Level 2'])
+    if 'Level 3' in df.columns:
+        index['Level 3'] = GroupIndex(pd.MultiIndex.from_arrays([df['Level 2'], df['Level 3']]))
+    for col in df.columns:
+        if col == 'KELOMPOK_JABATAN' or col.startswith('SEKTOR '):
+            index[col] = GroupIndex(df[col])
+    return index
+
+def list_bidang(index, skpd):
+    # Daftar Level 3 milik satu SKPD langsung dari kunci indeks pasangan (Level 2, Level 3)
+    keys = index['Level 3'].keys
+    return keys.get_level_values(1)[keys.get_level_values(0) == skpd].tolist()
+
+# Pemisah path pada id node Sunburst (tidak muncul di nama unit kerja)
+SUNBURST_SEP = '\x1f'
+SUNBURST_OTHERS = 'Lainnya'
+
+class RollupCube:
+    """Agregat TOTAL KEBUTUHAN & JUMLAH UNIT untuk setiap node Level 1..k.
+
+    Baris dikelompokkan sekali di level terdalam, lalu tiap level di atasnya
+    dijumlahkan dari level di bawahnya (bottom-up), sehingga node di level k
+    memuat total seluruh subtree-nya. `levels[k]` berisi kolom Level 1..k.
+    """
+    VALUE_COLS = ['TOTAL KEBUTUHAN', 'JUMLAH UNIT']
+
+    def __init__(self, df):
+        self.level_cols = [c for c in df.columns if c.startswith('Level ')]
+        base = pd.DataFrame({c: df[c] for c in self.level_cols})
+        base['TOTAL KEBUTUHAN'] = df['TOTAL KEBUTUHAN'] if 'TOTAL KEBUTUHAN' in df.columns else 0
+        base['JUMLAH UNIT'] = 1
+
+        self.total_kebutuhan = base['TOTAL KEBUTUHAN'].sum()
+        self.total_unit = len(base)
+        self.levels = {}
+        current = base
+        for k in range(len(self.level_cols), 0, -1):
+            current = current.groupby(self.level_cols[:k], sort=True, observed=True)[self.VALUE_COLS].sum().reset_index()
+            # Tabel node kecil: simpan Level sebagai teks biasa agar aman untuk plotly
+            self.levels[k] = current.astype({c: str for c in self.level_cols[:k]})
+        self._skpd_index = {k: GroupIndex(t['Level 2']) for k, t in self.levels.items() if k >= 2}
+        self._children = None
+
+    def skpd_names(self):
+        return self.levels[2]['Level 2'].unique() if 2 in self.levels else []
+
+    def valid_skpd(self):
+        # Nama Level 2 yang dihitung sebagai SKPD (tanpa '-', kosong, Bupati / Wakil)
+        return [
+            x for x in self.skpd_names()
+            if x != '-' and x.lower() != 'nan' and 'BUPATI' not in x.upper() and 'WAKIL' not in x.upper()
+        ]
+
+    def skpd_totals(self):
+        # Total per nama Level 2 (digabung lintas Level 1, sama seperti groupby('Level 2'))
+        return self.levels[2].groupby('Level 2', observed=True)[self.VALUE_COLS].sum().reset_index()
+
+    def under_skpd(self, skpd, k):
+        return self.levels[k].iloc[self._skpd_index[k].positions(skpd)]
+
+    def recap(self, skpd, cols):
+        deepest = self.under_skpd(skpd, len(self.level_cols))
+        return deepest.groupby(cols, observed=True)['TOTAL KEBUTUHAN'].sum().reset_index()
+
+    def _child_tables(self):
+        # Per kedalaman k: node Level 2..k (digabung lintas Level 1) urut nilai terbesar,
+        # diindeks per path induk. Dibuat sekali saat pertama dipakai.
+        if self._children is None:
+            tables = {}
+            for k in range(2, len(self.level_cols) + 1):
+                cols = self.level_cols[1:k]
+                table = self.levels[k]
+                if k == 2:
+                    table = table[(table['Level 2'] != '-') & (table['Level 2'] != 'nan')]
+                table = table.groupby(cols, sort=False, observed=True)[self.VALUE_COLS].sum().reset_index()
+                table = table.sort_values('TOTAL KEBUTUHAN', ascending=False, kind='stable', ignore_index=True)
+                parents = pd.MultiIndex.from_frame(table[cols[:-1]]) if k > 2 else np.zeros(len(table), dtype=np.int64)
+                tables[len(cols) - 1] = (table.rename(columns={cols[-1]: 'NAMA'})[['NAMA'] + self.VALUE_COLS], GroupIndex(parents))
+            self._children = tables
+        return self._children
+
+    def children(self, path):
+        # Anak langsung dari node `path` (nama Level 2, Level 3, ...), urut nilai terbesar.
+        # Digabung lintas Level 1, sama seperti Sunburst yang dimulai dari Level 2.
+        tables = self._child_tables()
+        if len(path) not in tables:
+            return pd.DataFrame(columns=['NAMA'] + self.VALUE_COLS)
+        table, index = tables[len(path)]
+        return table.iloc[index.positions(tuple(path) if path else 0)]
+
+    def sunburst_nodes(self, focus=(), depth=3, top_n=12):
+        """Node Sunburst (level of detail) mulai dari `focus`, sedalam `depth` lapis.
+
+        Tiap node hanya menampilkan `top_n` anak terbesar; sisanya digabung menjadi
+        satu node "Lainnya (n)" yang tidak diurai lagi. Nilai induk = jumlah anak
+        yang tampil, sehingga cocok untuk branchvalues='total'.
+        """
+        focus = tuple(focus)
+        root_id = SUNBURST_SEP.join(focus)
+        rows = []
+        if focus:
+            rows.append({'id': root_id, 'parent': '', 'label': focus[-1], 'path': focus})
+        frontier = [(focus, root_id)]
+        for _ in range(depth):
+            next_frontier = []
+            for path, node_id in frontier:
+                kids = self.children(path)
+                if kids.empty:
+                    continue
+                shown, rest = kids.iloc[:top_n], kids.iloc[top_n:]
+                for name, total, units in zip(shown['NAMA'], shown['TOTAL KEBUTUHAN'], shown['JUMLAH UNIT']):
+                    child_path = path + (name,)
+                    child_id = SUNBURST_SEP.join(child_path)
+                    rows.append({'id': child_id, 'parent': node_id, 'label': name, 'path': child_path,
+                                 'TOTAL KEBUTUHAN': total, 'JUMLAH UNIT': units})
+                    # '-' = unit tanpa level ini; anaknya juga '-' sehingga tidak perlu diurai
+                    if name != '-':
+                        next_frontier.append((child_path, child_id))
+                if not rest.empty:
+                    rows.append({'id': f"{node_id}{SUNBURST_SEP}{SUNBURST_OTHERS}", 'parent': node_id,
+                                 'label': f"{SUNBURST_OTHERS} ({len(rest)})", 'path': None,
+                                 'TOTAL KEBUTUHAN': rest['TOTAL KEBUTUHAN'].sum(), 'JUMLAH UNIT': rest['JUMLAH UNIT'].sum()})
+            frontier = next_frontier
+
+        nodes = pd.DataFrame(rows, columns=['id', 'parent', 'label', 'path'] + self.VALUE_COLS)
+        if nodes.empty:
+            return nodes
+        # Baris tersusun BFS (induk selalu sebelum anak). Nilai node yang anaknya tampil
+        # diganti jumlah anak tsb agar tidak ada selisih pembulatan dengan branchvalues='total'.
+        values = nodes[self.VALUE_COLS].to_numpy(dtype=float, na_value=0.0)
+        parent_pos = pd.Series(np.arange(len(nodes)), index=nodes['id']).reindex(nodes['parent']).to_numpy()
+        child_sum = np.zeros_like(values)
+        has_child = np.zeros(len(nodes), dtype=bool)
+        for i in range(len(nodes) - 1, -1, -1):
+            if has_child[i]:
+                values[i] = child_sum[i]
+            j = parent_pos[i]
+            if j == j:
+                child_sum[int(j)] += values[i]
+                has_child[int(j)] = True
+        nodes[self.VALUE_COLS] = values
+        return nodes
+
+_WS_RE = re.compile(r'\s+')
+
+def normalize_name(text):
+    return _WS_RE.sub(' ', str(text).upper())
+
+def _trigram_keys(codepoints):
+    # Tiga codepoint (masing-masing <= 21 bit) dipadatkan ke satu int64
+    return (codepoints[:-2] << 42) | (codepoints[1:-1] << 21) | codepoints[2:]
+
+class NameSearchIndex:
+    """Indeks trigram (inverted index) atas NAMA UNOR yang dinormalisasi.
+
+    Query >= 3 huruf: irisan posting list trigram -> kandidat, lalu diverifikasi
+    dengan pencocokan substring/prefix literal. Query lebih pendek dicek langsung
+    ke daftar nama unik (bukan ke seluruh baris).
+    """
+    MIN_FUZZY_SCORE = 0.5
+
+    def __init__(self, names):
+        codes, uniques = pd.factorize(pd.Series(names).map(normalize_name))
+        self.names = np.asarray(uniques, dtype=object)
+        self.rows = GroupIndex(codes)
+
+        lengths = np.fromiter((len(n) for n in self.names), dtype=np.int64, count=len(self.names))
+        text = '\x00'.join(self.names) + '\x00'
+        cps = np.frombuffer(text.encode('utf-32-le'), dtype=np.uint32).astype(np.int64)
+        name_ids = np.repeat(np.arange(len(self.names)), lengths + 1)
+
+        if len(cps) >= 3:
+            keys = _trigram_keys(cps)
+            valid = (cps[:-2] != 0) & (cps[1:-1] != 0) & (cps[2:] != 0)
+            keys, ids = keys[valid], name_ids[:-2][valid]
+        else:
+            keys, ids = np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+
+        order = np.lexsort((ids, keys))
+        keys, ids = keys[order], ids[order]
+        keep = np.ones(len(keys), dtype=bool)
+        keep[1:] = (keys[1:] != keys[:-1]) | (ids[1:] != ids[:-1])
+        keys, self.postings = keys[keep], ids[keep]
+        self.trigrams, starts = np.unique(keys, return_index=True)
+        self.offsets = np.append(starts, len(keys))
+
+    def _posting(self, key):
+        i = np.searchsorted(self.trigrams, key)
+        if i == len(self.trigrams) or self.trigrams[i] != key:
+            return self.postings[:0]
+        return self.postings[self.offsets[i]:self.offsets[i + 1]]
+
+    def _query_trigrams(self, q):
+        cps = np.frombuffer(q.encode('utf-32-le'), dtype=np.uint32).astype(np.int64)
+        return np.unique(_trigram_keys(cps)) if len(cps) >= 3 else np.zeros(0, dtype=np.int64)
+
+    def _name_ids(self, q, prefix):
+        grams = self._query_trigrams(q)
+        if len(grams):
+            candidates = None
+            for posting in sorted((self._posting(g) for g in grams), key=len):
+                candidates = posting if candidates is None else np.intersect1d(candidates, posting, assume_unique=True)
+                if len(candidates) == 0:
+                    break
+        else:
+            candidates = np.arange(len(self.names))
+
+        if prefix:
+            return np.array([i for i in candidates if self.names[i].startswith(q)], dtype=np.int64)
+        return np.array([i for i in candidates if q in self.names[i]], dtype=np.int64)
+
+    def _rows_of(self, name_ids):
+        if len(name_ids) == 0:
+            return self.rows.order[:0]
+        return np.concatenate([self.rows.positions(i) for i in name_ids])
+
+    def search(self, query, prefix=False):
+        # Posisi baris yang namanya memuat (atau diawali) query, urutan baris asli
+        q = normalize_name(query)
+        return np.sort(self._rows_of(self._name_ids(q, prefix)))
+
+    def search_fuzzy(self, query, limit=200):
+        # Peringkat berdasarkan proporsi trigram query yang ikut muncul di nama
+        q = normalize_name(query)
+        grams = self._query_trigrams(q)
+        if len(grams) == 0:
+            return self.search(query)
+
+        hits = np.concatenate([self._posting(g) for g in grams])
+        score = np.bincount(hits, minlength=len(self.names)) / len(grams)
+        contains = np.zeros(len(self.names), dtype=bool)
+        contains[self._name_ids(q, prefix=False)] = True
+        score[contains] += 1.0  # kecocokan persis selalu di atas
+
+        name_len = np.fromiter((len(n) for n in self.names), dtype=np.int64, count=len(self.names))
+        ranked = np.lexsort((name_len, -score))
+        ranked = ranked[score[ranked] >= self.MIN_FUZZY_SCORE][:limit]
+        return self._rows_of(ranked)
+
+# --- 2d. VALIDASI LISTING ---
+LISTING_CHUNK_ROWS = 100_000
+
+def _excel_rows(file_bytes):
+    # Baris sheet pertama satu per satu, tanpa membentuk DataFrame utuh
+    if python_calamine is not None:
+        workbook = python_calamine.CalamineWorkbook.from_filelike(io.BytesIO(file_bytes))
+        yield from workbook.get_sheet_by_index(0).iter_rows()
+    else:
+        import openpyxl
+        workbook = openpyxl.load_workbook(io.BytesIO(file_bytes), read_only=True, data_only=True)
+        try:
+            yield from workbook.worksheets[0].iter_rows(values_only=True)
+        finally:
+            workbook.close()
+
+def _id_text(value):
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value).strip()
+
+def iter_listing_chunks(file_bytes, file_name, chunk_rows=LISTING_CHUNK_ROWS):
+    rows = None
+    if not file_name.lower().endswith('.csv'):
+        try:
+            rows = _excel_rows(file_bytes)
+            first = next(rows, None)
+        except Exception:
+            rows = None  # bukan Excel yang valid -> coba sebagai CSV
+        else:
+            if first is None:
+                # Workbook valid tapi sheet pertama kosong: jangan dibaca ulang sebagai CSV
+                raise ValueError("File listing kosong: sheet pertama tidak berisi header maupun data.")
+            header = [str(c).strip().upper() for c in first]
+
+    if rows is not None:
+        while True:
+            batch = [r for r in itertools.islice(rows, chunk_rows) if any(v not in (None, '') for v in r)]
+            if not batch:
+                break
+            chunk = pd.DataFrame(batch, columns=header)
+            if 'ID' in chunk.columns:
+                chunk['ID'] = chunk['ID'].map(_id_text)
+            yield chunk
+        return
+
+    raw_header = pd.read_csv(io.BytesIO(file_bytes), nrows=0).columns
+    dtype = {c: str for c in raw_header if str(c).strip().upper() == 'ID'}
+    for chunk in pd.read_csv(io.BytesIO(file_bytes), dtype=dtype, chunksize=chunk_rows):
+        chunk.columns = [str(c).strip().upper() for c in chunk.columns]
+        if 'ID' in chunk.columns:
+            chunk['ID'] = chunk['ID'].astype(str).str.strip()
+        yield chunk
+
+def validate_listing(chunks, df, sotk_index):
+    """Hash-join listing pegawai ke SOTK lewat indeks ID, dalam satu kali jalan.
+
+    Tiap chunk dicocokkan via `sotk_index['ID']` (ID ganda di SOTK -> baris pertama),
+    jumlah per SKPD / per (SKPD, Bidang) diakumulasi, dan ID yang tidak ada di
+    SOTK dikumpulkan. Hasilnya siap dipakai drill-down tanpa merge ulang.
+    """
+    id_index = sotk_index['ID']
+    level_cols = [c for c in ['Level 2', 'Level 3'] if c in df.columns]
+    level_cats = {c: pd.Categorical(df[c]) for c in level_cols}
+
+    parts, unmatched = [], []
+    for chunk in chunks:
+        if 'ID' not in chunk.columns:
+            raise ValueError("Kolom 'ID' tidak ditemukan di file listing.")
+        codes = id_index.keys.get_indexer(pd.Index(chunk['ID'].to_numpy(dtype=object), dtype=object))
+        matched = codes >= 0
+        rows = np.where(matched, id_index.order[id_index.offsets[np.maximum(codes, 0)]], 0)
+
+        chunk = chunk.reset_index(drop=True)
+        for col, cat in level_cats.items():
+            level_codes = np.where(matched, cat.codes[rows], -1) if len(cat) else np.full(len(chunk), -1)
+            chunk[col] = pd.Categorical.from_codes(level_codes, categories=cat.categories)
+        parts.append(chunk)
+        unmatched.append(chunk.loc[~matched, 'ID'])
+
+    listing = pd.concat(parts, ignore_index=True) if parts else pd.DataFrame(columns=['ID'] + level_cols)
+    result = {'listing': listing, 'index': {}}
+
+    if 'Level 2' in listing.columns:
+        result['rekap_skpd'] = listing.groupby('Level 2', observed=True).size().reset_index(name='Jumlah').astype({'Level 2': str})
+        result['index']['Level 2'] = GroupIndex(listing['Level 2'])
+    if 'Level 3' in listing.columns:
+        result['rekap_bidang'] = listing.groupby(['Level 2', 'Level 3'], observed=True).size().reset_index(name='Jumlah').astype({'Level 2': str, 'Level 3': str})
+        result['index']['Level 3'] = GroupIndex(pd.MultiIndex.from_arrays([listing['Level 2'], listing['Level 3']]))
+
+    unmatched_ids = pd.concat(unmatched, ignore_index=True) if unmatched else pd.Series(dtype=object)
+    result['unmatched'] = unmatched_ids.value_counts().rename_axis('ID').reset_index(name='Jumlah Baris')
+    return result
+
+# --- 2e. ARSIP PERIODE ---
+ARSIP_DIR = os.environ.get('SOTK_ARSIP_DIR', '.sotk_arsip')
+PERIODE_RE = re.compile(r'^\d{4}(-(0[1-9]|1[0-2]))?$')  # '2025' atau '2025-06'
+
+def _write_atomic(table, path, metadata=None):
+    # Tulis ke file sementara lalu ganti, agar pembaca tidak pernah melihat file setengah jadi
+    table = pa.Table.from_pandas(table, preserve_index=False)
+    if metadata is not None:
+        table = table.replace_schema_metadata({**(table.schema.metadata or {}), b'sotk_arsip': json.dumps(metadata).encode('utf-8')})
+    tmp_path = f"{path}.tmp_{uuid.uuid4().hex}"
+    pq.write_table(table, tmp_path, compression='zstd')
+    os.replace(tmp_path, path)
+
+class ArsipSOTK:
+    """Arsip snapshot SOTK per periode untuk query tren tanpa membaca ulang file Excel.
+
+    Tiap snapshot (`periode/<periode>.parquet`, zstd) menyimpan kode integer: ID ke
+    `kamus_id.parquet` dan nama unit (NAMA UNOR, NAMA ATASAN, Level *) ke
+    `kamus_nama.parquet`. Kedua kamus dipakai bersama semua periode dan hanya
+    bertambah, sehingga kode sama antar periode dan query cukup membandingkan int.
+    Kolom teks lain disimpan sebagai kategori (dictionary-encoded). Metadata periode
+    (sumber, nama file, jumlah baris, ...) ada di `indeks.json` dan metadata Parquet.
+    """
+    NAME_COLS = ('NAMA UNOR', 'NAMA ATASAN')
+
+    def __init__(self, path=ARSIP_DIR):
+        self.path = path
+        self._lock = threading.Lock()
+        self._versi = None
+        self._cache = {}
+
+    def _file(self, *parts):
+        return os.path.join(self.path, *parts)
+
+    def _index(self):
+        try:
+            with open(self._file('indeks.json'), encoding='utf-8') as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            index = {'versi': 0, 'periode': {}}
+        # Arsip berubah (mungkin oleh proses lain): buang hasil baca sebelumnya
+        if index['versi'] != self._versi:
+            self._cache.clear()
+            self._versi = index['versi']
+        return index
+
+    def _cached(self, key, build):
+        if key not in self._cache:
+            self._cache[key] = build()
+        return self._cache[key]
+
+    def _kamus(self, name):
+        def build():
+            try:
+                return pd.Index(pd.read_parquet(self._file(f'kamus_{name}.parquet'))['NILAI'].astype(object))
+            except (OSError, ValueError):
+                return pd.Index([], dtype=object)
+        return self._cached(('kamus', name), build)
+
+    def _read(self, periode, columns):
+        return self._cached(
+            ('periode', periode, tuple(columns)),
+            lambda: pd.read_parquet(self._file('periode', f'{periode}.parquet'), columns=list(columns)),
+        )
+
+    @staticmethod
+    def _encode(kamus, values):
+        # Nilai unik di-encode sekali; nilai baru ditambahkan ke ujung kamus
+        codes, uniques = pd.factorize(pd.Series(values).astype(object))
+        mapped = kamus.get_indexer(pd.Index(uniques, dtype=object))
+        if (mapped < 0).any():
+            kamus = kamus.append(pd.Index(pd.Index(uniques, dtype=object)[mapped < 0]))
+            mapped = kamus.get_indexer(pd.Index(uniques, dtype=object))
+        return kamus, np.where(codes >= 0, mapped[codes], -1).astype(np.int32)
+
+    def _is_name_col(self, col):
+        return col in self.NAME_COLS or col.startswith('Level ')
+
+    def periods(self):
+        rows = self._index()['periode'].values()
+        return pd.DataFrame(sorted(rows, key=lambda m: m['periode']),
+                            columns=['periode', 'nama_file', 'baris', 'total_kebutuhan', 'sumber', 'dibuat'])
+
+    def find_source(self, sumber):
+        return [p for p, meta in self._index()['periode'].items() if meta['sumber'] == sumber]
+
+    def save(self, periode, df, sumber, nama_file):
+        if not PERIODE_RE.match(periode):
+            raise ValueError("Format periode harus TTTT atau TTTT-BB (mis. 2025 atau 2025-06).")
+        with self._lock:
+            os.makedirs(self._file('periode'), exist_ok=True)
+            index = self._index()
+            kamus = {name: self._kamus(name) for name in ('id', 'nama')}
+            size = {name: len(k) for name, k in kamus.items()}
+
+            columns = {}
+            for col in df.columns:
+                if col == 'ID':
+                    kamus['id'], columns[col] = self._encode(kamus['id'], df[col])
+                elif self._is_name_col(col):
+                    kamus['nama'], columns[col] = self._encode(kamus['nama'], df[col])
+                elif pd.api.types.is_numeric_dtype(df[col]):
+                    columns[col] = df[col].to_numpy()
+                else:
+                    columns[col] = df[col].astype('category')
+            snapshot = pd.DataFrame(columns)
+
+            meta = {
+                'periode': periode, 'sumber': sumber, 'nama_file': nama_file,
+                'baris': len(snapshot), 'total_kebutuhan': float(df['TOTAL KEBUTUHAN'].sum()),
+                'dibuat': time.strftime('%Y-%m-%d %H:%M:%S'),
+            }
+            # Urutan tulis: kamus -> snapshot -> indeks, agar indeks tidak menunjuk kode yang belum ada
+            for name, values in kamus.items():
+                if len(values) != size[name]:
+                    _write_atomic(pd.DataFrame({'NILAI': values.astype(str)}), self._file(f'kamus_{name}.parquet'))
+            _write_atomic(snapshot, self._file('periode', f'{periode}.parquet'), metadata=meta)
+            index['periode'][periode] = meta
+            self._write_index(index)
+
+    def delete(self, periode):
+        with self._lock:
+            index = self._index()
+            if index['periode'].pop(periode, None) is None:
+                return
+            self._write_index(index)
+            try:
+                os.remove(self._file('periode', f'{periode}.parquet'))
+            except OSError:
+                pass
+
+    def _write_index(self, index):
+        index['versi'] += 1
+        tmp_path = self._file(f'indeks.json.tmp_{uuid.uuid4().hex}')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(index, f, indent=1)
+        os.replace(tmp_path, self._file('indeks.json'))
+
+    def load(self, periode):
+        # Snapshot lengkap; kolom nama di-decode sebagai kategori atas kamus bersama
+        snapshot = pd.read_parquet(self._file('periode', f'{periode}.parquet'))
+        for col in snapshot.columns:
+            if col == 'ID' or self._is_name_col(col):
+                kamus = self._kamus('id' if col == 'ID' else 'nama')
+                snapshot[col] = pd.Categorical.from_codes(snapshot[col].to_numpy(), categories=kamus)
+        return snapshot
+
+    def kebutuhan_per_skpd(self):
+        """TOTAL KEBUTUHAN per SKPD (Level 2) x periode, urut nilai periode terakhir."""
+        periods = list(self.periods()['periode'])
+        if not periods:
+            return pd.DataFrame(columns=['Level 2'])
+        parts = []
+        for periode in periods:
+            snap = self._read(periode, ('Level 2', 'TOTAL KEBUTUHAN'))
+            parts.append(snap.groupby('Level 2')['TOTAL KEBUTUHAN'].sum().rename(periode))
+        wide = pd.concat(parts, axis=1).fillna(0)
+
+        kamus = self._kamus('nama')
+        wide = wide[wide.index >= 0]
+        wide.index = kamus[wide.index.to_numpy()]
+        wide = wide[wide.index != '-'].groupby(level=0).sum()
+        wide = wide.sort_values(periods[-1], ascending=False)
+        return wide.rename_axis('Level 2').reset_index()
+
+    def perubahan_unit(self):
+        """Jumlah unit, kebutuhan, serta ID baru/dihapus dibanding periode sebelumnya."""
+        rows = []
+        previous = None
+        for periode in self.periods()['periode']:
+            snap = self._read(periode, ('ID', 'TOTAL KEBUTUHAN'))
+            ids = np.unique(snap['ID'].to_numpy())
+            total = float(snap['TOTAL KEBUTUHAN'].sum())
+            row = {'PERIODE': periode, 'JUMLAH UNIT': len(snap), 'TOTAL KEBUTUHAN': total,
+                   'BARU': None, 'DIHAPUS': None, 'SELISIH KEBUTUHAN': None}
+            if previous is not None:
+                row['BARU'] = len(np.setdiff1d(ids, previous[0], assume_unique=True))
+                row['DIHAPUS'] = len(np.setdiff1d(previous[0], ids, assume_unique=True))
+                row['SELISIH KEBUTUHAN'] = total - previous[1]
+            rows.append(row)
+            previous = (ids, total)
+        out = pd.DataFrame(rows, columns=['PERIODE', 'JUMLAH UNIT', 'TOTAL KEBUTUHAN', 'BARU', 'DIHAPUS', 'SELISIH KEBUTUHAN'])
+        return out.astype({'BARU': 'Int64', 'DIHAPUS': 'Int64', 'SELISIH KEBUTUHAN': 'Float64'})
+
+    def rincian_perubahan(self, periode_lama, periode_baru):
+        """Daftar unit BARU (ada di periode_baru saja) dan DIHAPUS (ada di periode_lama saja)."""
+        cols = ('ID', 'NAMA UNOR', 'Level 2', 'TOTAL KEBUTUHAN')
+        lama, baru = self._read(periode_lama, cols), self._read(periode_baru, cols)
+        parts = [
+            baru[~baru['ID'].isin(lama['ID'])].assign(PERUBAHAN='BARU'),
+            lama[~lama['ID'].isin(baru['ID'])].assign(PERUBAHAN='DIHAPUS'),
+        ]
+        out = pd.concat(parts, ignore_index=True)
+        out['ID'] = self._kamus('id')[out['ID'].to_numpy()]
+        for col in ('NAMA UNOR', 'Level 2'):
+            codes = out[col].to_numpy()
+            out[col] = np.where(codes >= 0, self._kamus('nama').to_numpy()[np.maximum(codes, 0)], None)
+        return out[['PERUBAHAN', 'ID', 'NAMA UNOR', 'Level 2', 'TOTAL KEBUTUHAN']]
+
+    def riwayat_id(self, id_unor):
+        """Nama, SKPD dan kebutuhan satu ID di tiap periode tempat ID itu ada."""
+        columns = ['PERIODE', 'NAMA UNOR', 'Level 2', 'TOTAL KEBUTUHAN']
+        periods = self.periods()['periode']  # baca indeks dulu agar kamus tidak basi
+        kamus_id = self._kamus('id')
+        if id_unor not in kamus_id:
+            return pd.DataFrame(columns=columns)
+        code = kamus_id.get_loc(id_unor)
+        names = np.append(self._kamus('nama').to_numpy(), None)  # kode -1 -> None
+        parts = []
+        for periode in periods:
+            snap = self._read(periode, ('ID', 'NAMA UNOR', 'Level 2', 'TOTAL KEBUTUHAN'))
+            hit = snap['ID'].to_numpy() == code
+            if hit.any():
+                # Per kolom (bukan iterrows) agar kode nama tetap integer
+                parts.append(pd.DataFrame({
+                    'PERIODE': periode,
+                    'NAMA UNOR': names[snap['NAMA UNOR'].to_numpy()[hit]],
+                    'Level 2': names[snap['Level 2'].to_numpy()[hit]],
+                    'TOTAL KEBUTUHAN': snap['TOTAL KEBUTUHAN'].to_numpy()[hit],
+                }))
+        return pd.concat(parts, ignore_index=True) if parts else pd.DataFrame(columns=columns)
+
+# --- 2f. LAPORAN KONSOLIDASI ---
+# Satu workbook berisi seluruh rekap SKPD, rollup Level 1..k, distribusi jabatan dan
+# temuan integritas. Ditulis bertahap (constant_memory) ke folder cache data olahannya.
+LAPORAN_FILE = 'laporan_konsolidasi.xlsx'
+LAPORAN_DIBUAT = datetime.datetime(2000, 1, 1)  # tanggal tetap: data sama -> isi file sama persis
+TIDAK_TERKLASIFIKASI = '(Tidak terklasifikasi)'
+
+def laporan_path(key):
+    return os.path.join(CACHE_DIR, key, LAPORAN_FILE)
+
+def laporan_sheets(df, orphans, tabel, cube):
+    """Daftar (nama sheet, keterangan, DataFrame) laporan konsolidasi, urutan tetap."""
+    skpd = sorted(cube.valid_skpd())
+    sheets = []
+    if 2 in cube.levels:
+        rekap = cube.skpd_totals()
+        rekap = rekap[rekap['Level 2'].isin(skpd)].rename(columns={'Level 2': 'SKPD'})
+        sheets.append(('Rekap SKPD', "Total kebutuhan & jumlah unit per SKPD", rekap))
+    if 3 in cube.levels:
+        # Sama dengan Rekapitulasi Struktur di tab Struktur SKPD, untuk semua SKPD sekaligus
+        deepest = cube.levels[len(cube.level_cols)]
+        deepest = deepest[deepest['Level 2'].isin(skpd)]
+        per_skpd = deepest.groupby(cube.level_cols[1:], observed=True)['TOTAL KEBUTUHAN'].sum().reset_index()
+        sheets.append(('Rekap per SKPD', "Rekapitulasi struktur tiap SKPD (Level 3 ke bawah)", per_skpd.rename(columns={'Level 2': 'SKPD'})))
+    for k, table in sorted(cube.levels.items()):
+        sheets.append((f'Rollup Level {k}', f"Total subtree tiap node Level {k}", table))
+
+    if 'KELOMPOK_JABATAN' in df.columns:
+        jabatan = df['KELOMPOK_JABATAN'].cat.add_categories([TIDAK_TERKLASIFIKASI]).fillna(TIDAK_TERKLASIFIKASI)
+        kebutuhan = df['TOTAL KEBUTUHAN'] if 'TOTAL KEBUTUHAN' in df.columns else pd.Series(0, index=df.index)
+        distribusi = kebutuhan.groupby(jabatan, observed=False).agg(['size', 'sum'])
+        distribusi = distribusi.set_axis(['JUMLAH UNIT', 'TOTAL KEBUTUHAN'], axis=1).rename_axis('KELOMPOK JABATAN').reset_index()
+        sheets.append(('Distribusi Jabatan', "Jumlah unit & kebutuhan per kelompok jabatan", distribusi))
+        if 'Level 2' in df.columns:
+            matriks = pd.crosstab(df['Level 2'].astype(str), jabatan).reindex(index=skpd, columns=jabatan.cat.categories, fill_value=0)
+            matriks['TOTAL'] = matriks.sum(axis=1)
+            sheets.append(('Jabatan per SKPD', "Jumlah unit per kelompok jabatan di tiap SKPD", matriks.rename_axis(index='SKPD', columns=None).reset_index()))
+
+    sheets += [
+        ('Integritas Yatim', "Unit dengan ID atasan yang tidak ditemukan", orphans),
+        ('Integritas Siklus', "Anggota rantai atasan melingkar", tabel['siklus']),
+        ('Integritas ID Ganda', "ID yang muncul di lebih dari satu baris", tabel['duplikat']),
+        ('Integritas Kedalaman', f"Unit melebihi Level {MAX_LEVELS} / batas hop", tabel['kedalaman']),
+        ('Integritas Akar', "Akar tiap pohon terpisah beserta ukurannya", tabel['akar']),
+    ]
+    return sheets
+
+def write_laporan_konsolidasi(output, df, orphans, tabel, cube):
+    # `output`: path atau objek file biner
+    sheets = laporan_sheets(df, orphans, tabel, cube)
+    ringkasan = [
+        ("Jumlah unit", cube.total_unit, None),
+        ("Total kebutuhan", cube.total_kebutuhan, None),
+        ("Jumlah SKPD", len(cube.valid_skpd()), None),
+        ("Unit yatim", len(orphans), None),
+        ("Siklus", tabel['siklus']['SIKLUS'].nunique(), None),
+        ("ID ganda", len(tabel['duplikat']), None),
+        (f"Melebihi Level {MAX_LEVELS}", len(tabel['kedalaman']), None),
+        ("Pohon terpisah", max(len(tabel['akar']) - 1, 0), None),
+    ]
+    for name, keterangan, table in sheets:
+        if len(table) > EXCEL_MAX_ROWS:
+            keterangan += f" (terpotong {EXCEL_MAX_ROWS:,} baris pertama)"
+        ringkasan.append((f"Sheet '{name}'", len(table), keterangan))
+    ringkasan = pd.DataFrame(ringkasan, columns=['URAIAN', 'NILAI', 'KETERANGAN'])
+
+    with xlsxwriter.Workbook(output, EXCEL_STREAM_OPTIONS) as workbook:
+        workbook.set_properties({'title': 'Laporan Konsolidasi SOTK', 'created': LAPORAN_DIBUAT})
+        header = workbook.add_format({'bold': True, 'bottom': 1})
+        write_sheet(workbook, 'Ringkasan', ringkasan, header)
+        for name, _, table in sheets:
+            with METRICS.stage('laporan.sheet'):
+                write_sheet(workbook, name, table, header)
+
+def build_laporan_file(file_key, progress=None):
+    # Dari data olahan di cache disk -> laporan_konsolidasi.xlsx di folder yang sama.
+    # Hasil: None bila berhasil, atau pesan error.
+    progress = progress or (lambda tahap: None)
+    if LARGE_EXCEL_ENGINE != 'xlsxwriter':
+        return "Paket xlsxwriter diperlukan untuk membuat laporan konsolidasi."
+    progress('laporan_muat')
+    cached = cache_load(file_key)
+    if cached is None:
+        return "Data olahan tidak ditemukan di cache. Upload ulang file SOTK."
+    df, orphans, _, tabel = cached
+
+    progress('laporan_tulis')
+    path = laporan_path(file_key)
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    try:
+        with METRICS.stage('laporan.tulis'):
+            write_laporan_konsolidasi(tmp_path, df, orphans, tabel, RollupCube(df))
+        os.replace(tmp_path, path)
+    except Exception as e:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        return f"Gagal membuat laporan: {e}"
+    return None
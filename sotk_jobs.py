@@ -0,0 +1,227 @@
+# Pemrosesan upload SOTK di latar belakang (tanpa Streamlit).
+#
+# Satu job per isi file (file_key): upload identik dari beberapa sesi memakai job yang
+# sama. Orkestrasi dan cek cache disk berjalan di thread pool (I/O); baca file dan
+# penyusunan hierarki berjalan di process pool (CPU) sehingga tidak mengunci GIL server.
+# Hasil disimpan ke cache disk (sotk_core.cache_store); dashboard lalu memuatnya dari sana.
+# Laporan konsolidasi Excel dibuat dengan cara yang sama, dari data olahan di cache disk.
+import multiprocessing
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import CancelledError, ProcessPoolExecutor, ThreadPoolExecutor
+
+from sotk_core import build_laporan_file, build_sotk_file, cache_exists, laporan_path
+from sotk_metrics import METRICS
+
+IO_WORKERS = int(os.environ.get('SOTK_IO_WORKERS', '4'))
+CPU_WORKERS = int(os.environ.get('SOTK_CPU_WORKERS', str(max(1, min(4, (os.cpu_count() or 2) - 1)))))
+FINISHED_JOBS = 64  # job selesai yang diingat (tanpa data, hanya status)
+
+# Label & perkiraan progres tiap tahap
+TAHAP = {
+    'antre': ("Menunggu giliran pemrosesan", 0.05),
+    'cek_cache': ("Memeriksa cache", 0.10),
+    'baca_file': ("Membaca file", 0.20),
+    'olah': ("Menyusun hierarki & klasifikasi", 0.50),
+    'simpan': ("Menyimpan hasil olahan", 0.85),
+    'laporan_muat': ("Memuat data olahan", 0.20),
+    'laporan_tulis': ("Menulis laporan Excel", 0.50),
+    'selesai': ("Selesai", 1.0),
+    'gagal': ("Gagal", 1.0),
+    'dibatalkan': ("Dibatalkan", 1.0),
+}
+
+_progress_queue = None
+
+def _init_worker(queue):
+    global _progress_queue
+    _progress_queue = queue
+
+def _queue_progress(key):
+    def progress(tahap):
+        if _progress_queue is not None:
+            _progress_queue.put((key, tahap))
+    return progress
+
+# Tugas berikut dijalankan di proses worker; hanya pesan error (atau None) yang dikirim
+# balik, hasilnya diambil dari cache disk agar tidak perlu di-pickle
+def _build_in_worker(key, file_name, file_bytes, progress=None):
+    df, message, _, _ = build_sotk_file(key, file_name, file_bytes, progress or _queue_progress(key))
+    return message if df is None else None
+
+def _laporan_in_worker(key, file_key, progress=None):
+    return build_laporan_file(file_key, progress or _queue_progress(key))
+
+def _laporan_key(file_key):
+    return f'laporan:{file_key}'
+
+class Job:
+    def __init__(self, key, file_key, file_name, cancellable=True):
+        self.key = key
+        self.file_key = file_key
+        self.file_name = file_name
+        self.cancellable = cancellable
+        self.tahap = 'antre'
+        self.error = None
+        self.started = time.time()
+        self.stage_started = self.started
+        self.subscribers = set()
+        self.future = None
+        self._done = threading.Event()
+
+    @property
+    def done(self):
+        return self._done.is_set()
+
+    def wait(self, timeout=None):
+        return self._done.wait(timeout)
+
+    def progress(self):
+        label, fraction = TAHAP.get(self.tahap, (self.tahap, 0.0))
+        return label, fraction, time.time() - self.started
+
+class SotkJobs:
+    """Antrian job pemrosesan SOTK bersama untuk semua sesi dalam satu proses server.
+
+    `submit(sesi, file_key, ...)` mengembalikan job untuk isi file tersebut (baru atau
+    yang sudah berjalan). Upload baru dari sesi yang sama menggantikan upload lamanya:
+    job lama yang tidak lagi ditunggu sesi mana pun dibatalkan bila belum mulai diolah;
+    yang sudah berjalan tetap diselesaikan ke cache disk, hanya tidak ditunggu lagi.
+    `submit_laporan(file_key, ...)` membuat laporan konsolidasi Excel di antrian yang sama.
+    """
+    def __init__(self, io_workers=IO_WORKERS, cpu_workers=CPU_WORKERS):
+        self.io_pool = ThreadPoolExecutor(io_workers, thread_name_prefix='sotk-io')
+        self.cpu_workers = cpu_workers
+        self._cpu_pool = None
+        self._queue = None
+        self._lock = threading.Lock()
+        self._cpu_lock = threading.Lock()
+        self.jobs = OrderedDict()  # file_key -> Job
+        self.sessions = {}         # sesi -> file_key yang sedang ditunggu
+
+    def _cpu(self):
+        # Process pool dibuat saat pertama dibutuhkan (spawn: aman untuk server bertread)
+        with self._cpu_lock:
+            if self._cpu_pool is None:
+                try:
+                    ctx = multiprocessing.get_context('spawn')
+                    if self._queue is None:
+                        self._queue = ctx.Queue()
+                        threading.Thread(target=self._drain_progress, name='sotk-progress', daemon=True).start()
+                    self._cpu_pool = ProcessPoolExecutor(
+                        self.cpu_workers, mp_context=ctx, initializer=_init_worker, initargs=(self._queue,)
+                    )
+                except (OSError, ImportError, NotImplementedError):
+                    # Lingkungan tanpa dukungan multiprocessing: olah di thread I/O saja
+                    self._cpu_pool = False
+            return self._cpu_pool
+
+    def _drain_progress(self):
+        while True:
+            key, tahap = self._queue.get()
+            job = self.jobs.get(key)
+            if job is not None and not job.done:
+                self._set_stage(job, tahap)
+
+    def _set_stage(self, job, tahap):
+        now = time.time()
+        if METRICS.active():
+            METRICS.observe(f'latar.{job.tahap}', now - job.stage_started)
+        job.tahap, job.stage_started = tahap, now
+
+    def submit(self, sesi, file_key, file_name, file_bytes):
+        with self._lock:
+            previous = self.sessions.get(sesi)
+            if previous is not None and previous != file_key:
+                self._release(sesi, previous)
+            self.sessions[sesi] = file_key
+
+            job = self.jobs.get(file_key)
+            if job is None or job.tahap == 'dibatalkan':
+                job = Job(file_key, file_key, file_name)
+                self.jobs[file_key] = job
+                METRICS.incr('latar.job_baru')
+                job.future = self.io_pool.submit(
+                    self._run, job, lambda: cache_exists(file_key), _build_in_worker, file_name, file_bytes
+                )
+            else:
+                METRICS.incr('latar.job_dipakai_ulang')
+            self.jobs.move_to_end(file_key)
+            job.subscribers.add(sesi)
+            self._prune()
+        return job
+
+    def submit_laporan(self, file_key, file_name):
+        # Laporan konsolidasi untuk data yang sudah diolah; tidak terikat sesi sehingga tidak
+        # dibatalkan saat pengguna berganti file. Job yang sudah selesai dibuat ulang bila diminta lagi.
+        key = _laporan_key(file_key)
+        with self._lock:
+            job = self.jobs.get(key)
+            if job is None or job.done:
+                job = Job(key, file_key, file_name, cancellable=False)
+                self.jobs[key] = job
+                METRICS.incr('latar.laporan')
+                job.future = self.io_pool.submit(
+                    self._run, job, lambda: os.path.exists(laporan_path(file_key)), _laporan_in_worker, file_key
+                )
+            self.jobs.move_to_end(key)
+            self._prune()
+        return job
+
+    def laporan_job(self, file_key):
+        return self.jobs.get(_laporan_key(file_key))
+
+    def release(self, sesi):
+        with self._lock:
+            file_key = self.sessions.pop(sesi, None)
+            if file_key is not None:
+                self._release(sesi, file_key)
+
+    def _release(self, sesi, file_key):
+        job = self.jobs.get(file_key)
+        if job is None:
+            return
+        job.subscribers.discard(sesi)
+        if not job.subscribers and not job.done and job.future is not None and job.future.cancel():
+            self._finish(job, 'dibatalkan')
+
+    def _prune(self):
+        finished = [k for k, j in self.jobs.items() if j.done and not j.subscribers]
+        for key in finished[:max(0, len(finished) - FINISHED_JOBS)]:
+            del self.jobs[key]
+        self.sessions = {s: k for s, k in self.sessions.items() if k in self.jobs}
+
+    def _finish(self, job, tahap, error=None):
+        job.error = error
+        self._set_stage(job, tahap)
+        job._done.set()
+
+    def _run(self, job, ready, task, *args):
+        # `ready()`: hasil sudah ada di cache disk; `task(key, *args)`: tugas di proses worker
+        try:
+            self._set_stage(job, 'cek_cache')
+            if ready():
+                self._finish(job, 'selesai')
+                return
+
+            self._set_stage(job, 'antre')
+            pool = self._cpu()
+            if pool:
+                job.future = pool.submit(task, job.key, *args)
+                if job.cancellable and not job.subscribers:
+                    job.future.cancel()
+                error = job.future.result()
+            else:
+                error = task(job.key, *args, progress=lambda t: self._set_stage(job, t))
+            self._finish(job, 'gagal' if error else 'selesai', error)
+        except CancelledError:
+            self._finish(job, 'dibatalkan')
+        except Exception as e:
+            # Mis. worker mati (BrokenProcessPool): izinkan upload ulang mencoba lagi
+            self._finish(job, 'dibatalkan', f"Pemrosesan terhenti: {e}")
+            with self._cpu_lock:
+                if self._cpu_pool:
+                    self._cpu_pool.shutdown(wait=False, cancel_futures=True)
+                    self._cpu_pool = None
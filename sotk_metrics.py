@@ -0,0 +1,177 @@
+# Instrumentasi ringan: waktu per tahap, counter cache, latensi rerun dan memori proses.
+#
+# Perekaman aktif bila env SOTK_METRICS=1 (seluruh proses) atau bila sebuah rerun
+# dimulai dengan begin_run(force=True) (mis. sesi dengan ?debug=1). Saat tidak aktif,
+# stage() mengembalikan context kosong bersama sehingga biayanya praktis nol.
+#
+# Keluaran opsional setiap akhir rerun:
+#   SOTK_METRICS_LOG  : file JSON Lines (satu baris per rerun)
+#   SOTK_METRICS_PROM : file teks format Prometheus (untuk textfile collector)
+import contextlib
+import json
+import os
+import threading
+import time
+import uuid
+from collections import deque
+
+_NULL = contextlib.nullcontext()
+
+def rss_bytes():
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        try:
+            import resource
+            return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+        except ImportError:
+            return 0
+
+class Metrics:
+    """Agregat waktu per tahap dan counter, dibagi semua sesi dalam satu proses.
+
+    `stages[nama]` = [jumlah panggilan, total detik, maks detik, detik terakhir].
+    Rerun aktif disimpan per thread, jadi tahap di dalam fungsi inti (yang berjalan
+    di thread sesi) ikut tercatat pada rerun sesi tersebut.
+    """
+    RERUN_HISTORY = 200
+
+    def __init__(self, enabled=False, log_path=None, prom_path=None):
+        self.enabled = enabled
+        self.log_path = log_path
+        self.prom_path = prom_path
+        self.stages = {}
+        self.counters = {}
+        self.reruns = deque(maxlen=self.RERUN_HISTORY)
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def active(self):
+        return self.enabled or getattr(self._local, 'run', None) is not None
+
+    def stage(self, name):
+        if not self.active():
+            return _NULL
+        return self._timed(name)
+
+    @contextlib.contextmanager
+    def _timed(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start)
+
+    def observe(self, name, seconds):
+        with self._lock:
+            entry = self.stages.setdefault(name, [0, 0.0, 0.0, 0.0])
+            entry[0] += 1
+            entry[1] += seconds
+            entry[2] = max(entry[2], seconds)
+            entry[3] = seconds
+        run = getattr(self._local, 'run', None)
+        if run is not None:
+            run['stages'][name] = run['stages'].get(name, 0.0) + seconds
+
+    def incr(self, name, n=1):
+        if not self.active():
+            return
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def begin_run(self, force=False):
+        # Selalu ditimpa: rerun yang terhenti (st.stop) tidak boleh terbawa ke rerun berikutnya
+        self._local.run = {'start': time.perf_counter(), 'stages': {}} if self.enabled or force else None
+
+    def current_run(self):
+        return getattr(self._local, 'run', None)
+
+    @contextlib.contextmanager
+    def use_run(self, run):
+        # Pasang rerun milik thread lain, mis. callback unduhan yang dijalankan belakangan
+        previous = self.current_run()
+        self._local.run = run
+        try:
+            yield
+        finally:
+            self._local.run = previous
+
+    def end_run(self):
+        run = getattr(self._local, 'run', None)
+        if run is None:
+            return None
+        self._local.run = None
+        record = {
+            'waktu': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'rerun_ms': round((time.perf_counter() - run['start']) * 1000, 2),
+            'rss_mb': round(rss_bytes() / 1024 / 1024, 1),
+            'stages_ms': {k: round(v * 1000, 2) for k, v in run['stages'].items()},
+        }
+        with self._lock:
+            self.reruns.append(record)
+        # Gagal menulis metrik tidak boleh menghentikan rerun dashboard
+        try:
+            if self.log_path:
+                with open(self.log_path, 'a', encoding='utf-8') as f:
+                    f.write(json.dumps(record) + '\n')
+            if self.prom_path:
+                self.write_prometheus(self.prom_path)
+        except OSError:
+            pass
+        return record
+
+    def hit_rates(self):
+        # Pasangan counter '<x>.hit'/'<x>.miss'; untuk tahap 'cache.*' (pembungkus st.cache_*)
+        # jumlah panggilan = jumlah eksekusi tahap, miss dicatat dari dalam fungsi yang di-cache
+        rates = {}
+        with self._lock:
+            prefixes = {n.rsplit('.', 1)[0] for n in self.counters if n.endswith(('.hit', '.miss'))}
+            prefixes |= {n for n in self.stages if n.startswith('cache.')}
+            for prefix in prefixes:
+                misses = self.counters.get(f'{prefix}.miss', 0)
+                if f'{prefix}.hit' in self.counters:
+                    calls = self.counters[f'{prefix}.hit'] + misses
+                else:
+                    calls = self.stages.get(prefix, [0])[0]
+                if calls:
+                    rates[prefix] = (calls, max(0.0, 1 - misses / calls))
+        return rates
+
+    def to_prometheus(self):
+        with self._lock:
+            stages = {k: list(v) for k, v in self.stages.items()}
+            counters = dict(self.counters)
+            reruns = list(self.reruns)
+        lines = [
+            '# HELP sotk_stage_calls_total Jumlah eksekusi tiap tahap.',
+            '# TYPE sotk_stage_calls_total counter',
+        ]
+        lines += [f'sotk_stage_calls_total{{stage="{k}"}} {v[0]}' for k, v in sorted(stages.items())]
+        lines += ['# HELP sotk_stage_seconds_total Total detik tiap tahap.', '# TYPE sotk_stage_seconds_total counter']
+        lines += [f'sotk_stage_seconds_total{{stage="{k}"}} {v[1]:.6f}' for k, v in sorted(stages.items())]
+        lines += ['# HELP sotk_events_total Counter kejadian (cache miss, dll).', '# TYPE sotk_events_total counter']
+        lines += [f'sotk_events_total{{name="{k}"}} {v}' for k, v in sorted(counters.items())]
+        if reruns:
+            lines += ['# HELP sotk_last_rerun_seconds Latensi rerun terakhir.', '# TYPE sotk_last_rerun_seconds gauge']
+            lines.append(f"sotk_last_rerun_seconds {reruns[-1]['rerun_ms'] / 1000:.6f}")
+        lines += ['# HELP sotk_rss_bytes Memori resident proses.', '# TYPE sotk_rss_bytes gauge', f'sotk_rss_bytes {rss_bytes()}']
+        return '\n'.join(lines) + '\n'
+
+    def write_prometheus(self, path):
+        # Nama sementara unik: beberapa sesi bisa selesai rerun bersamaan
+        tmp_path = f'{path}.{uuid.uuid4().hex}.tmp'
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.write(self.to_prometheus())
+            os.replace(tmp_path, path)
+        except OSError:
+            with contextlib.suppress(OSError):
+                os.remove(tmp_path)
+            raise
+
+METRICS = Metrics(
+    enabled=os.environ.get('SOTK_METRICS') == '1',
+    log_path=os.environ.get('SOTK_METRICS_LOG'),
+    prom_path=os.environ.get('SOTK_METRICS_PROM'),
+)
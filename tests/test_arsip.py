@@ -0,0 +1,32 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sotk_core import ArsipSOTK, process_sotk_data  # noqa: E402
+
+def processed(kebutuhan):
+    raw = pd.DataFrame({
+        'ID': ['A', 'B', 'C'],
+        'NAMA UNOR': ['PEMDA', 'DINAS A', 'BIDANG A'],
+        'DIATASAN ID': [None, 'A', 'B'],
+        'TOTAL KEBUTUHAN': kebutuhan,
+    })
+    return process_sotk_data(raw)[0]
+
+def test_riwayat_id_with_float_kebutuhan_right_after_save(tmp_path):
+    arsip = ArsipSOTK(str(tmp_path))
+    assert arsip.riwayat_id('C').empty  # kamus kosong sempat terbaca sebelum save
+
+    arsip.save('2025-01', processed([1, 2, np.nan]), 'sumber-1', 'sotk_jan.xlsx')
+    arsip.save('2025-02', processed([1, 2, 5]), 'sumber-2', 'sotk_feb.xlsx')
+
+    riwayat = arsip.riwayat_id('C')
+    assert riwayat['PERIODE'].tolist() == ['2025-01', '2025-02']
+    assert riwayat['NAMA UNOR'].tolist() == ['BIDANG A', 'BIDANG A']
+    assert riwayat['Level 2'].tolist() == ['DINAS A', 'DINAS A']
+    assert riwayat['TOTAL KEBUTUHAN'].tolist() == [0, 5]
+    assert arsip.riwayat_id('TIDAK ADA').empty
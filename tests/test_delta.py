@@ -0,0 +1,85 @@
+import io
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sotk_core import arrow_safe, process_sotk_data  # noqa: E402
+
+def random_sotk(units, rng, shallow=False):
+    # shallow: pohon lebar 2-3 level, agar revisi bisa menambah kolom Level
+    parents = [None] + [f'U{rng.integers(0, min(i, 4) if shallow else i)}' for i in range(1, units)]
+    return pd.DataFrame({
+        'ID': [f'U{i}' for i in range(units)],
+        'NAMA UNOR': [f'UNIT {i}' for i in range(units)],
+        'DIATASAN ID': parents,
+        'ESELON': rng.choice(['II.a', 'III.a', 'IV.a', None], units),
+        'JENIS JABATAN': rng.choice(['STRUKTURAL', 'FUNGSIONAL', 'PELAKSANA'], units),
+        'TOTAL KEBUTUHAN': rng.integers(0, 5, units).astype(float),
+    })
+
+def revise(df, rng, chain=False):
+    # Revisi bulanan: unit baru, pindah atasan, ganti nama, dihapus, kebutuhan berubah
+    df = df.copy()
+    n = len(df)
+    moved = rng.choice(np.arange(1, n), max(1, n // 20), replace=False)
+    df.loc[moved, 'DIATASAN ID'] = [f'U{rng.integers(0, n)}' for _ in moved]
+    renamed = rng.choice(n, max(1, n // 20), replace=False)
+    df.loc[renamed, 'NAMA UNOR'] = [f'UNIT BARU {i}' for i in renamed]
+    df.loc[rng.choice(n, max(1, n // 10), replace=False), 'TOTAL KEBUTUHAN'] = np.nan
+    df = df.drop(index=rng.choice(np.arange(1, n), max(1, n // 30), replace=False))
+    extra = max(1, n // 15)
+    parents = rng.choice(df['ID'].to_numpy(), extra)
+    if chain:
+        # Unit baru bertingkat: versi baru bisa lebih dalam dari versi lama (kolom Level baru)
+        parents[1:] = [f'N{i}' for i in range(extra - 1)]
+    new = pd.DataFrame({
+        'ID': [f'N{i}' for i in range(extra)],
+        'NAMA UNOR': [f'UNIT TAMBAHAN {i}' for i in range(extra)],
+        'DIATASAN ID': parents,
+        'ESELON': None, 'JENIS JABATAN': 'PELAKSANA', 'TOTAL KEBUTUHAN': 1.0,
+    })
+    return pd.concat([df, new], ignore_index=True).sample(frac=1, random_state=int(rng.integers(1 << 30)), ignore_index=True)
+
+def cached_previous(raw):
+    # Versi lama seperti yang dibaca kembali dari cache disk (Parquet)
+    df, _, _, tabel = process_sotk_data(raw.copy())
+    def round_trip(table):
+        buffer = io.BytesIO()
+        arrow_safe(table.reset_index(drop=True)).to_parquet(buffer, index=False)
+        return pd.read_parquet(buffer)
+    return {'data': round_trip(df), 'kerangka': round_trip(tabel['kerangka'])}
+
+def assert_delta_matches_full(old_raw, new_raw):
+    previous = cached_previous(old_raw)
+    full = process_sotk_data(new_raw.copy())
+    delta = process_sotk_data(new_raw.copy(), previous=previous)
+    assert delta[3]['perubahan'] is not None
+    pd.testing.assert_frame_equal(delta[0], full[0])
+    pd.testing.assert_frame_equal(delta[1], full[1])
+    for key in ('max_depth', 'cyclic_ids', 'overflow_ids'):
+        assert delta[2][key] == full[2][key]
+
+@pytest.mark.parametrize('seed', range(25))
+def test_delta_equals_full_on_random_revisions(seed):
+    rng = np.random.default_rng(seed)
+    deeper = seed % 2 == 1
+    old = random_sotk(int(rng.integers(20, 400)), rng, shallow=deeper)
+    assert_delta_matches_full(old, revise(old, rng, chain=deeper))
+
+def test_delta_equals_full_when_new_version_is_deeper():
+    old = pd.DataFrame({
+        'ID': ['A', 'B', 'C', 'D'],
+        'NAMA UNOR': ['PEMDA', 'DINAS', 'BIDANG', 'SEKSI'],
+        'DIATASAN ID': [None, 'A', 'B', 'C'],
+        'TOTAL KEBUTUHAN': [1.0, 2.0, 3.0, 4.0],
+    })
+    new = pd.concat([old, pd.DataFrame({
+        'ID': ['E'], 'NAMA UNOR': ['SUBSEKSI'], 'DIATASAN ID': ['D'], 'TOTAL KEBUTUHAN': [5.0],
+    })], ignore_index=True)
+    assert_delta_matches_full(old, new)
+    assert 'Level 5' in process_sotk_data(new.copy(), previous=cached_previous(old))[0].columns
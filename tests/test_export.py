@@ -0,0 +1,46 @@
+import io
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import sotk_core  # noqa: E402
+from sotk_core import build_export_bytes  # noqa: E402
+
+def sample_frame(rows):
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame({
+        'ID': [f'U{i:06d}' for i in range(rows)],
+        'NAMA UNOR': [f'SEKSI {i}' for i in range(rows)],
+        'Level 2': pd.Categorical(rng.choice(['DINAS A', 'DINAS B', '-'], rows)),
+        'TOTAL KEBUTUHAN': rng.integers(0, 10, rows),
+        'RASIO': rng.random(rows),
+    })
+    df.loc[::7, 'NAMA UNOR'] = None
+    return df
+
+@pytest.mark.parametrize('large', [False, True])
+def test_xlsx_export_round_trip(monkeypatch, large):
+    df = sample_frame(300)
+    # Jalur tabel besar (xlsxwriter constant_memory) diuji dengan ambang kecil
+    monkeypatch.setattr(sotk_core, 'EXPORT_LARGE_ROWS', 100 if large else 10_000)
+
+    back = pd.read_excel(io.BytesIO(build_export_bytes(df, 'xlsx')), sheet_name='Data')
+
+    assert list(back.columns) == list(df.columns)
+    assert len(back) == len(df)
+    for col in ['ID', 'NAMA UNOR', 'Level 2']:
+        expected = df[col].astype(object).where(df[col].notna(), None).tolist()
+        assert back[col].astype(object).where(back[col].notna(), None).tolist() == expected
+    assert back['TOTAL KEBUTUHAN'].tolist() == df['TOTAL KEBUTUHAN'].tolist()
+    np.testing.assert_allclose(back['RASIO'], df['RASIO'])
+
+def test_csv_export_round_trip():
+    df = sample_frame(50)
+    back = pd.read_csv(io.BytesIO(build_export_bytes(df, 'csv')), encoding='utf-8-sig')
+    assert back['ID'].tolist() == df['ID'].tolist()
+    assert back['TOTAL KEBUTUHAN'].tolist() == df['TOTAL KEBUTUHAN'].tolist()